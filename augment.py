@@ -1,11 +1,21 @@
-import sys
+import os
+import argparse
 from docsim.augmentor import Augmentor
+from docsim.utils.sinks import add_output_arguments, get_sink_from_args
 
 if __name__ == '__main__':
-    config_json, input_folder = sys.argv[1:3]
-    epochs = int(sys.argv[3]) if len(sys.argv) > 3 else 1
-    output_folder = sys.argv[4] if len(sys.argv) > 4 else None
-    num_workers = int(sys.argv[5]) if len(sys.argv) > 5 else 1
+    parser = argparse.ArgumentParser(description='Augment generated documents')
+    parser.add_argument('config_json', help='Path to the augmentation config JSON')
+    parser.add_argument('input_folder', help='Folder of generated samples')
+    parser.add_argument('epochs', type=int, nargs='?', default=1, help='Number of augmented variants per sample')
+    parser.add_argument('output_folder', nargs='?', default=None, help='Folder to write the augmented samples to')
+    parser.add_argument('num_workers', type=int, nargs='?', default=None,
+                        help='Number of processes to augment with (default: the number of available cores)')
+    parser.add_argument('--chunk_size', type=int, default=None, help='Number of images sent to a worker at once')
+    add_output_arguments(parser)
+    args = parser.parse_args()
     
-    a = Augmentor(config_json)
-    a(input_folder, epochs, output_folder, num_workers)
+    a = Augmentor(args.config_json)
+    output_folder = args.output_folder or os.path.join(args.input_folder, 'augmented')
+    sink = get_sink_from_args(output_folder, args)
+    a(args.input_folder, args.epochs, num_workers=args.num_workers, sink=sink, chunk_size=args.chunk_size)
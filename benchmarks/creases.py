@@ -0,0 +1,81 @@
+'''
+Measures the creases & curls augmentation on ID-card sized images (1000x700 by default):
+the time per image, split into building the coarse displacement field, remapping the image, and moving the box corners.
+Also checks how far the moved corners are from where the remap actually samples them (in pixels).
+
+Usage: python benchmarks/creases.py [--runs N] [--width W] [--height H] [--boxes N]
+'''
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from docsim.augmentation.custom_augs import CreasesAndCurls
+from docsim.utils.warp import get_displacement_maps, remap
+
+def random_boxes(width, height, num_boxes):
+    boxes = []
+    for i in range(num_boxes):
+        x, y = random.uniform(0, width - 200), random.uniform(0, height - 40)
+        w, h = random.uniform(20, 200), random.uniform(10, 40)
+        boxes.append([(x, y), (x + w, y), (x + w, y + h), (x, y + h)])
+    return boxes
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the creases & curls augmentation')
+    parser.add_argument('--runs', type=int, default=20, help='Number of images to augment')
+    parser.add_argument('--width', type=int, default=1000, help='Width of the images')
+    parser.add_argument('--height', type=int, default=700, help='Height of the images')
+    parser.add_argument('--boxes', type=int, default=50, help='Number of boxes per image')
+    args = parser.parse_args()
+
+    random.seed(0)
+    np.random.seed(0)
+    aug = CreasesAndCurls(num_deform_rounds=2)
+    image = np.random.randint(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+
+    # The steps of CreasesAndCurls.__call__(), timed one by one
+    times = {'field': 0, 'remap': 0, 'points': 0}
+    max_error = 0
+    for i in range(args.runs):
+        boxes = random_boxes(args.width, args.height, args.boxes)
+        dh, dw = args.height // aug.img_pad_ratio, args.width // aug.img_pad_ratio
+        rows, cols = args.height + 2*dh, args.width + 2*dw
+        deformations = [aug.get_random_deformation(cols, rows) for _ in range(aug.num_deform_rounds)]
+
+        start = time.perf_counter()
+        field = aug.create_field(rows, cols, deformations)
+        region = aug.get_region(field, (dh, dh + args.height, dw, dw + args.width), (rows, cols))
+        times['field'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        get_maps = get_displacement_maps(field, aug.field_step, offset=(dw, dh))
+        remap(image, get_maps, region, cv2.INTER_CUBIC, cv2.BORDER_CONSTANT)
+        times['remap'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        corners = np.array([point for box in boxes for point in box]) + (dw, dh)
+        moved = aug.get_inv_coordinates(corners, deformations, cols)
+        times['points'] += time.perf_counter() - start
+
+        # The maps at the (nearest pixel of the) moved corners should point back to the corners
+        for (x, y), corner in zip(np.round(moved).astype(int), corners):
+            if 0 <= x < cols and 0 <= y < rows:
+                xs, ys = get_maps(y, y + 1, x, x + 1)
+                error = np.hypot(xs[0, 0] + dw - corner[0], ys[0, 0] + dh - corner[1])
+                max_error = max(max_error, error)
+
+    start = time.perf_counter()
+    for i in range(args.runs):
+        aug(image=image, points=np.array(random_boxes(args.width, args.height, args.boxes), dtype=np.float32))
+    total = (time.perf_counter() - start) / args.runs
+
+    print('%dx%d, %d boxes' % (args.width, args.height, args.boxes))
+    for step, seconds in times.items():
+        print('%-8s %8.1f ms' % (step, seconds / args.runs * 1000))
+    print('%-8s %8.1f ms   (incl. cropping)' % ('total', total * 1000))
+    print('max corner error: %.2f px' % max_error)
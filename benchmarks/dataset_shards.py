@@ -0,0 +1,59 @@
+'''
+Checks that the shards of a GeneratorDataset together cover exactly the indices [start, start+num_samples)
+of the run, once each: over a grid of run sizes & numbers of shards, and through an actual DataLoader,
+whose seeded samples must be those iter_samples() yields for the whole run.
+
+Usage: python benchmarks/dataset_shards.py [--template T.json] [--num_samples N] [--workers N]
+'''
+import os
+import sys
+import hashlib
+import argparse
+from collections import Counter
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from docsim.generator import Generator, get_run_indices
+from docsim.dataset import GeneratorDataset
+
+def check_indices():
+    '''
+    The runs (of the grid) whose shards don't cover them exactly
+    '''
+    failures = []
+    for start in [0, 7]:
+        for num_samples in range(0, 13):
+            for num_shards in range(1, 6):
+                indices = Counter(index for shard_id in range(num_shards)
+                                  for index in get_run_indices(num_samples, start, num_shards, shard_id))
+                if indices != Counter(range(start, start + num_samples)):
+                    failures.append((start, num_samples, num_shards))
+    return failures
+
+def image_hash(image):
+    # The DataLoader turns the arrays into tensors
+    return hashlib.md5(np.asarray(image).tobytes()).hexdigest()
+
+if __name__ == '__main__':
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Check the sharding of GeneratorDataset')
+    parser.add_argument('--template', default=os.path.join(root, 'templates', 'PAN', 'New', 'template.json'))
+    parser.add_argument('--num_samples', type=int, default=10, help='Number of samples of the run')
+    parser.add_argument('--workers', type=int, default=3, help='Number of DataLoader workers')
+    args = parser.parse_args()
+
+    failures = check_indices()
+    for start, num_samples, num_shards in failures:
+        print('MISMATCH: %d samples from %d in %d shards' % (num_samples, start, num_shards))
+    print('Index grid: %s' % ('%d mismatches' % len(failures) if failures else 'OK'))
+
+    from torch.utils.data import DataLoader
+    dataset = GeneratorDataset(args.template, num_samples=args.num_samples, seed=0, start_index=5)
+    loader = DataLoader(dataset, batch_size=None, num_workers=args.workers)
+    loaded = Counter(image_hash(image) for image, gt in loader)
+    expected = Counter(image_hash(image) for image, gt in
+                       Generator(args.template).iter_samples(args.num_samples, 0, 5, as_numpy=True))
+    print('DataLoader: %d samples with %d workers, %s' % (sum(loaded.values()), args.workers,
+                                                         'same as the run' if loaded == expected else 'MISMATCH'))
+
+    sys.exit(1 if failures or loaded != expected else 0)
@@ -0,0 +1,80 @@
+'''
+Measures the throughput of online faces against a local stand-in server, which serves
+random JPEGs with a given latency: fetching one face per sample (as before prefetching),
+with the prefetcher, and from the prefetcher's cache alone (offline).
+
+Usage: python benchmarks/face_prefetch.py [--faces N] [--latency SECONDS] [--threads N]
+'''
+import os
+import io
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from docsim.utils.face_prefetcher import FacePrefetcher
+
+def random_jpeg(size=256):
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.randint(0, 256, (size, size, 3), dtype=np.uint8)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+def start_server(latency, num_images=64):
+    images = [random_jpeg() for i in range(num_images)]
+
+    class FaceHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            data = images[np.random.randint(num_images)]
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FaceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:%d/image' % server.server_address[1]
+
+def measure(get_face, num_faces):
+    '''
+    Faces per second, decoding each like OnlineFaceGenerator does
+    '''
+    start = time.perf_counter()
+    for i in range(num_faces):
+        Image.open(io.BytesIO(get_face())).load()
+    return num_faces / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the face prefetcher against a local server')
+    parser.add_argument('--faces', type=int, default=100, help='Number of faces to get in each mode')
+    parser.add_argument('--latency', type=float, default=0.2, help='Latency of the server per request, in seconds')
+    parser.add_argument('--threads', type=int, default=8, help='Number of prefetching threads')
+    args = parser.parse_args()
+
+    import requests
+    server, url = start_server(args.latency)
+    cache_folder = tempfile.mkdtemp()
+    try:
+        sequential = measure(lambda: requests.get(url).content, args.faces)
+        print('%-12s %8.1f faces/s' % ('sequential', sequential))
+
+        prefetcher = FacePrefetcher(url, cache_folder, args.threads, min_cached=args.faces * 2)
+        prefetched = measure(prefetcher.get, args.faces)
+        print('%-12s %8.1f faces/s   (%.1fx)' % ('prefetched', prefetched, prefetched / sequential))
+        prefetcher.close()
+
+        server.shutdown()
+        offline = measure(FacePrefetcher(url, cache_folder, offline=True).get, args.faces)
+        print('%-12s %8.1f faces/s   (%d images cached)' % ('offline', offline, len(os.listdir(cache_folder))))
+    finally:
+        shutil.rmtree(cache_folder)
@@ -0,0 +1,54 @@
+'''
+Measures the startup cost of DocSim, each step in a fresh interpreter:
+importing the generator & augmentor modules, and building a Generator & Augmentor.
+Also lists which heavy backend libraries got imported by each step.
+
+Usage: python benchmarks/import_time.py [--template T.json] [--augment_config C.json] [--runs N]
+'''
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['faker', 'aksharamukha', 'indic_transliteration', 'transliterate', 'tamil',
+                 'qrcode', 'barcode', 'requests', 'imgaug', 'albumentations', 'ocrodeg', 'cv2']
+
+SNIPPET = '''
+import sys, time, json
+start = time.perf_counter()
+%s
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'loaded': [m for m in %r if m in sys.modules]}))
+'''
+
+def measure(code, runs):
+    '''
+    Best time of the given code over multiple fresh interpreters, and the heavy modules it loaded
+    '''
+    results = []
+    for i in range(runs):
+        output = subprocess.run([sys.executable, '-c', SNIPPET % (code, HEAVY_MODULES)], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return min(result['seconds'] for result in results), results[-1]['loaded']
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the import & setup time of DocSim')
+    parser.add_argument('--template', default='templates/PAN/New/template.json', help='Template to build a Generator for')
+    parser.add_argument('--augment_config', default='templates/sample_augmentation/config.json',
+                        help='Config to build an Augmentor for')
+    parser.add_argument('--runs', type=int, default=3, help='Number of runs per step (the best is reported)')
+    args = parser.parse_args()
+
+    steps = [
+        ('import docsim.generator', 'import docsim.generator'),
+        ('import docsim.augmentor', 'import docsim.augmentor'),
+        ('Generator(template)', 'from docsim.generator import Generator; Generator(%r)' % args.template),
+        ('Augmentor(config)', 'from docsim.augmentor import Augmentor; Augmentor(%r)' % args.augment_config),
+    ]
+    for name, code in steps:
+        seconds, loaded = measure(code, args.runs)
+        print('%-25s %7.3fs   loaded: %s' % (name, seconds, ', '.join(loaded) or '-'))
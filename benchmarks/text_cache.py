@@ -0,0 +1,63 @@
+'''
+Checks that texts drawn through the TextBitmapCache are pixel-identical to ImageDraw.text(),
+for single & multiline texts with every alignment (centered & right-aligned lines can start at
+fractional offsets), and measures the time per text drawn each way.
+
+Usage: python benchmarks/text_cache.py [--font F.ttf] [--size N] [--runs N]
+'''
+import os
+import sys
+import time
+import argparse
+from glob import glob
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from docsim.utils.fonts import get_font
+from docsim.utils.text_cache import TextBitmapCache
+
+TEXTS = ['Xyz.', 'Xyz.\nSecond line', 'a\nlonger middle line\nbc', 'Wide line here\ni', ' ']
+ALIGNS = ['left', 'center', 'right']
+POSITIONS = [(10, 12), (37, 5)]
+
+def draw_direct(canvas, xy, text, font, align):
+    ImageDraw.Draw(canvas).text(xy, text, fill=(10, 20, 30), font=font, align=align, spacing=4)
+
+def draw_cached(cache):
+    def draw(canvas, xy, text, font, align):
+        cache.draw(ImageDraw.Draw(canvas), xy, text, font, (10, 20, 30), align, 4)
+    return draw
+
+def render(draw, xy, text, font, align):
+    canvas = Image.new('RGB', (400, 200), 'white')
+    draw(canvas, xy, text, font, align)
+    return canvas
+
+if __name__ == '__main__':
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Check & benchmark the text bitmap cache')
+    parser.add_argument('--font', default=None, help='Font to draw with (default: the first .ttf in the repo)')
+    parser.add_argument('--size', type=int, default=23, help='Font size')
+    parser.add_argument('--runs', type=int, default=200, help='Number of times to draw each text')
+    args = parser.parse_args()
+
+    font_file = args.font or sorted(glob(os.path.join(root, '**', '*.ttf'), recursive=True))[0]
+    font = get_font(font_file, args.size)
+    cache = TextBitmapCache()
+
+    cases = [(text, align, xy) for text in TEXTS for align in ALIGNS for xy in POSITIONS]
+    mismatches = [case for case in cases if render(draw_direct, case[2], case[0], font, case[1]).tobytes()
+                                            != render(draw_cached(cache), case[2], case[0], font, case[1]).tobytes()]
+    for text, align, xy in mismatches:
+        print('MISMATCH: %r, align=%s, at %s' % (text, align, xy))
+    print('%d/%d texts pixel-identical (%s)' % (len(cases) - len(mismatches), len(cases), os.path.basename(font_file)))
+
+    canvas = Image.new('RGB', (400, 200), 'white')
+    for name, draw in [('direct', draw_direct), ('cached', draw_cached(cache))]:
+        start = time.perf_counter()
+        for i in range(args.runs):
+            for text, align, xy in cases:
+                draw(canvas, xy, text, font, align)
+        print('%-8s %8.1f us/text' % (name, (time.perf_counter() - start) / (args.runs * len(cases)) * 1e6))
+
+    sys.exit(1 if mismatches else 0)
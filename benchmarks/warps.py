@@ -0,0 +1,73 @@
+'''
+Measures the time and peak memory (of NumPy & OpenCV arrays, traced by tracemalloc) of the geometric augmentations
+on a high-DPI scan (an A4 page at 300 DPI by default). The ocrodeg warps are compared with ocrodeg's own functions,
+distorting one channel at a time with a full-resolution noise field, as they were used before.
+
+Usage: python benchmarks/warps.py [--runs N] [--width W] [--height H]
+'''
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from docsim.augmentation.ocr_deg import GaussianWarp, RuledSurface1dDistort
+from docsim.augmentation.custom_augs import CreasesAndCurls
+
+def ocrodeg_distort(image, noise):
+    import ocrodeg
+    output = np.empty_like(image)
+    for i in range(image.shape[-1]):
+        output[:, :, i] = ocrodeg.distort_with_noise(image[:, :, i], noise.copy())
+    return output
+
+def ocrodeg_gaussian_warp(image):
+    import ocrodeg
+    return ocrodeg_distort(image, ocrodeg.bounded_gaussian_noise(image.shape[:2], sigma=5.0, maxdelta=5.0))
+
+def ocrodeg_1d_surface_distort(image):
+    import ocrodeg
+    return ocrodeg_distort(image, ocrodeg.noise_distort1d(image.shape[:2], magnitude=25.0))
+
+def measure(augment, image, runs):
+    '''
+    Milliseconds per image, and the peak of memory allocated beyond the input image, in MB
+    '''
+    start = time.perf_counter()
+    for i in range(runs):
+        augment(image.copy())
+    seconds = (time.perf_counter() - start) / runs
+
+    image = image.copy()
+    tracemalloc.start()
+    augment(image)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds * 1000, peak / 2**20
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the geometric augmentations on a large image')
+    parser.add_argument('--runs', type=int, default=3, help='Number of images to augment with each')
+    parser.add_argument('--width', type=int, default=2480, help='Width of the image')
+    parser.add_argument('--height', type=int, default=3508, help='Height of the image')
+    args = parser.parse_args()
+
+    random.seed(0)
+    np.random.seed(0)
+    image = np.random.randint(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+    creases = CreasesAndCurls(num_deform_rounds=2)
+    augmentations = [
+        ('gaussian_warp', GaussianWarp(sigma=(5.0, 5.0), maxdelta=(5.0, 5.0))),
+        ('  (ocrodeg)', ocrodeg_gaussian_warp),
+        ('1d_surface_distort', RuledSurface1dDistort(magnitude=(25.0, 25.0))),
+        ('  (ocrodeg)', ocrodeg_1d_surface_distort),
+        ('creases_and_curls', lambda image: creases(image, np.zeros((0, 4, 2), dtype=np.float32))),
+    ]
+
+    print('%dx%d image: %.1f MB' % (args.width, args.height, image.nbytes / 2**20))
+    for name, augment in augmentations:
+        milliseconds, peak = measure(augment, image, args.runs)
+        print('%-20s %9.1f ms %9.1f MB peak' % (name, milliseconds, peak))
@@ -1,15 +1,9 @@
 import albumentations as albu
 import random
-from imgaug.augmentables.polys import Polygon, PolygonsOnImage
+from docsim.augmentation.registry import AUGMENTATION_BACKENDS
 
 class Albumentor:
-    SUPPORTED_AUGMENTATIONS = [
-        'image_compression',
-        'posterize',
-        'blur',
-        'median_blur',
-        'iso_noise'
-    ]
+    SUPPORTED_AUGMENTATIONS = AUGMENTATION_BACKENDS[__name__ + '.Albumentor']
 
     def __init__(self, main_config):
         self.shuffle = main_config.shuffle
@@ -51,7 +45,7 @@ class Albumentor:
 
         return
 
-    def augment_image(self, img, gt, completed_groups):
+    def augment_image(self, img, points, gt, completed_groups):
         if self.shuffle: 
             random.shuffle(self.augmentors)
 
@@ -66,10 +60,11 @@ class Albumentor:
                 img = aug(image=img)["image"]
                 gt["augs_done"].append(aug.name)
         
-        return img, gt
+        # Only pixel-level transforms: the points are unchanged
+        return img, points
     
     @staticmethod
-    def run_augment(aug, img, gt):
+    def run_augment(aug, img, points):
         img = aug(image=img)["image"]       
-        return img, gt
+        return img, points
 
@@ -3,11 +3,11 @@ import cv2
 from PIL import Image
 import random
 import math
+from docsim.augmentation.registry import AUGMENTATION_BACKENDS
+from docsim.utils.warp import get_coarse_grid, get_displacement_maps, remap
 
 class CustomAugmentations:
-    SUPPORTED_AUGMENTATIONS = [
-        'creases_and_curls',
-    ]
+    SUPPORTED_AUGMENTATIONS = AUGMENTATION_BACKENDS[__name__ + '.CustomAugmentations']
     def __init__(self, main_config):
         self.shuffle = main_config.shuffle
         self.augname2groups = main_config.augname2groups
@@ -29,12 +29,10 @@ class CustomAugmentations:
             self.augmentors.append(aug)
         return 
     
-    def augment_image(self, img, gt, completed_groups):
+    def augment_image(self, img, points, gt, completed_groups):
         if self.shuffle: 
             random.shuffle(self.augmentors)
 
-        bboxes = [(element['points']) for element in gt["data"]]
-        
         for aug in self.augmentors:
             if random.random() < aug.p and len(gt["augs_done"]) < self.max_augmentations_per_image:
                 if aug.name in self.augname2groups:
@@ -43,13 +41,10 @@ class CustomAugmentations:
                     else:
                         completed_groups.update(self.augname2groups[aug.name])
                 
-                img, bboxes = aug(image=img, gt=bboxes)
+                img, points = aug(image=img, points=points)
                 gt["augs_done"].append(aug.name)
         
-        for element, point in zip(gt["data"], bboxes):
-            element['points'] = point
-        
-        return img, gt
+        return img, points
     
     
 ## -------------------- Augmentors --------------------- ##
@@ -60,43 +55,35 @@ class CreasesAndCurls:
     https://stackoverflow.com/questions/53907633/how-to-warp-an-image-using-deformed-mesh
     '''
 
-    def __init__(self, num_deform_rounds=2, img_pad_ratio=3, folding_prob=0.3):
+    def __init__(self, num_deform_rounds=2, img_pad_ratio=3, folding_prob=0.3, field_step=4):
         self.img_pad_ratio = img_pad_ratio
         self.folding_prob = folding_prob
         self.num_deform_rounds = num_deform_rounds
+        self.field_step = field_step
     
-    def __call__(self, image, gt):
-
-        # Enlarge image
-        nw, nh = image.shape[0], image.shape[1]
-        dw, dh = nw//self.img_pad_ratio, nh//self.img_pad_ratio
+    def __call__(self, image, points):
 
-        padded_img = cv2.copyMakeBorder(
-            image, dh, dh, dw, dw, borderType=cv2.BORDER_CONSTANT, value=(0, 0, 0))
+        # Enlarge image (only virtually: the pixels warped from outside it come out black)
+        rows, cols = image.shape[0], image.shape[1]
+        dh, dw = rows//self.img_pad_ratio, cols//self.img_pad_ratio
+        padded_rows, padded_cols = rows + 2*dh, cols + 2*dw
 
-        # Pad the points
-        pad_bboxes = []
-        for point in gt:
-            pad_bboxes.append([(box[0] + dw, box[1] + dh) for box in point])
+        deformations = [self.get_random_deformation(padded_cols, padded_rows)
+                        for _ in range(self.num_deform_rounds)]
 
-        xs, ys = self.create_grid(padded_img)
+        field = self.create_field(padded_rows, padded_cols, deformations)
+        region = self.get_region(field, (dh, dh + rows, dw, dw + cols), (padded_rows, padded_cols))
+        dst = remap(image, get_displacement_maps(field, self.field_step, offset=(dw, dh)), region,
+                    cv2.INTER_CUBIC, cv2.BORDER_CONSTANT)
 
-        padded_nw, padded_nh = padded_img.shape[0], padded_img.shape[1]
-        xs = xs.reshape(padded_nh, padded_nw).astype(np.float32)
-        ys = ys.reshape(padded_nh, padded_nw).astype(np.float32)
-        dst = cv2.remap(padded_img, xs, ys, cv2.INTER_CUBIC)
-        inv_xs, inv_ys = self.get_inv_coordinates(xs, ys)
+        # Pad the points, and move them along with the pixels under them
+        moved_points = points.reshape(-1, 2).astype(np.float64) + (dw, dh)
+        moved_points = self.get_inv_coordinates(moved_points, deformations, padded_cols) - (region[2], region[0])
 
-        # Adjust the bouding boxes based on distortion
-        adjusted_bboxes = []
-        for box in pad_bboxes:
-            adjusted_bboxes.append(
-                [(inv_ys[int(i[0]), int(i[1])], inv_xs[int(i[0]), int(i[1])]) for i in box])
+        cropped_image, cropped_points = self.croput_black_portions(
+            dst, moved_points.reshape(points.shape).astype(np.float32))
 
-        cropped_image, cropped_bboxes = self.croput_black_portions(
-            dst, adjusted_bboxes)
-
-        return cropped_image, cropped_bboxes
+        return cropped_image, cropped_points
 
     def get_random_vs(self, rows, cols):
         vertex = (random.randint(int(0.30 * rows), int(0.70 * rows)),
@@ -114,81 +101,87 @@ class CreasesAndCurls:
 
         return vertex, v, k, avg
 
+    def get_random_deformation(self, width, height):
+        '''
+        A random crease (line) or curl (curve): its vertex, direction & strength, and how it weighs distances
+        '''
+        vertex, v, k, avg = self.get_random_vs(width, height)
+        if np.random.rand(1) >= self.folding_prob:
+            return vertex, v, k, "line", avg/3
+        else:
+            return vertex, v, k, "curve", 1.5
+
     def shortest_distance(self, vertex_x, vertex_y, point_x, point_y, k):
         c = k * vertex_x - vertex_y
         b, a = -1 * k, 1
         d = abs(a * point_x + b * point_y + c) / math.sqrt(a * a + b * b)
         return d
 
-    def create_grid(self, img):
-        rows = img.shape[0]
-        columns = img.shape[1]
-        shape = img.shape
-        X, Y = np.meshgrid(np.arange(shape[0]), np.arange(shape[1]))
-        ms = np.vstack([X.ravel(), Y.ravel()]).T
-
-        def get_w(alpha, dist_xy, rows, type):
-            return (alpha / (dist_xy + alpha)) if type == "line" else 1 - math.pow(dist_xy / (rows/2), alpha)
-
-        for _ in range(self.num_deform_rounds):
-            vertex, v, k, avg = self.get_random_vs(rows, columns)
-            k = math.tan(v[0])
-
-            distances = np.vectorize(self.shortest_distance)(
-                vertex[0], vertex[1], ms[:, 0], ms[:, 1], k)
-            curve_type = np.random.rand(1)
-
-            if curve_type >= self.folding_prob:
-                type = "line"
-                alpha = avg/3
-            else:
-                type = "curve"
-                alpha = 1.5
-
-            weights = np.vectorize(get_w)(alpha, distances, rows, type)
-            ms[:, 0] = ms[:, 0]-(v[1]*math.cos(v[0])*weights)
-            ms[:, 1] = ms[:, 1]-(v[1]*math.sin(v[0])*weights)
-
-        return ms[:, 0], ms[:, 1]
-
-    def get_inv_coordinates(self, xs, ys):
-
-        # TODO: Vectorize
-        inv_xs, inv_ys = np.zeros(xs.shape), np.zeros(ys.shape)
-        for col in range(xs.shape[0]):
-            for row in range(xs.shape[1]):
-                dst_x, dst_y = xs[col, row], ys[col, row]
-                if dst_x < xs.shape[0] and dst_x >= 0 and dst_y < xs.shape[1] and dst_y >= 0:
-                    inv_xs[int(dst_x), int(dst_y)] = col
-                    inv_ys[int(dst_x), int(dst_y)] = row
-
-        inv_xs[inv_xs == 0] = np.nan
-        inv_ys[inv_ys == 0] = np.nan
-
-        def fill_zeros_with_last(arr):
-            mask = np.isnan(arr)
-            idx = np.where(~mask, np.arange(mask.shape[1]), 0)
-            np.maximum.accumulate(idx, axis=1, out=idx)
-            out = arr[np.arange(idx.shape[0])[:, None], idx]
-            return out
-
-        inv_xs = fill_zeros_with_last(inv_xs)
-        inv_ys = fill_zeros_with_last(inv_ys)
-
-        return inv_xs, inv_ys
-
-    def croput_black_portions(self, img, bboxes):
+    def deform(self, xs, ys, deformation, width):
+        '''
+        Source coordinates of the given (arrays of) points, for one round of deformation
+        '''
+        vertex, v, k, type, alpha = deformation
+        distances = self.shortest_distance(vertex[0], vertex[1], xs, ys, k)
+        if type == "line":
+            weights = alpha / (distances + alpha)
+        else:
+            weights = 1 - (distances / (width/2)) ** alpha
+        return xs - (v[1]*math.cos(v[0])*weights), ys - (v[1]*math.sin(v[0])*weights)
+
+    def create_field(self, rows, cols, deformations):
+        '''
+        The (dx, dy) displacements to the source pixels, on a coarse grid (a node every `field_step` pixels)
+        '''
+        node_ys, node_xs = get_coarse_grid((rows, cols), self.field_step)
+        xs, ys = np.meshgrid(node_xs, node_ys)
+        src_xs, src_ys = xs, ys
+        for deformation in deformations:
+            src_xs, src_ys = self.deform(src_xs, src_ys, deformation, cols)
+        return np.dstack([src_xs - xs, src_ys - ys])
+
+    def get_region(self, field, content, shape):
+        '''
+        The (y0, y1, x0, x1) region of the deformed image which the given region of the source
+        (its content, without the padding) can end up in, with a margin of a couple of nodes
+        '''
+        step = self.field_step
+        node_ys, node_xs = get_coarse_grid(shape, step)
+        src_ys = field[..., 1] + node_ys[:, None]
+        src_xs = field[..., 0] + node_xs
+        margin = 2*step + 2
+        inside = (src_ys > content[0] - margin) & (src_ys < content[1] + margin) & \
+                 (src_xs > content[2] - margin) & (src_xs < content[3] + margin)
+        rows, cols = np.nonzero(inside.any(axis=1))[0], np.nonzero(inside.any(axis=0))[0]
+        if len(rows) == 0:
+            return 0, shape[0], 0, shape[1]
+        return max(0, (rows[0] - 1) * step), min(shape[0], (rows[-1] + 2) * step), \
+               max(0, (cols[0] - 1) * step), min(shape[1], (cols[-1] + 2) * step)
+
+    def get_inv_coordinates(self, points, deformations, width, num_iterations=20, tolerance=1e-3):
+        '''
+        Where the given (N x 2) source points end up in the deformed image.
+        Instead of inverting the whole map, every round is undone (the last one first) for the points alone,
+        by fixed-point iteration: the displacements vary slowly enough for it to converge.
+        '''
+        for deformation in reversed(deformations):
+            targets = points
+            for _ in range(num_iterations):
+                xs, ys = self.deform(points[:, 0], points[:, 1], deformation, width)
+                errors = targets - np.stack([xs, ys], axis=1)
+                points = points + errors
+                if np.abs(errors).max(initial=0) < tolerance:
+                    break
+        return points
+
+    def croput_black_portions(self, img, points):
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if len(img.shape)>2 else img
         _, thresh = cv2.threshold(gray, 1, 255, cv2.THRESH_BINARY)
         contours, _ = cv2.findContours(
             thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         if len(contours) == 0:
-            return img, bboxes
+            return img, points
         cnt = contours[0]
         x, y, w, h = cv2.boundingRect(cnt)
 
-        cropped_bboxes = []
-        for point in bboxes:
-            cropped_bboxes.append([(box[0] - x, box[1] - y)
-                                   for box in point])
-        return img[y:y+h, x:x+w], cropped_bboxes
+        return img[y:y+h, x:x+w], points - np.array([x, y], dtype=np.float32)
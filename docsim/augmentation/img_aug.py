@@ -1,23 +1,11 @@
 import random
 import imgaug.augmenters as iaa
-from imgaug.augmentables.polys import Polygon, PolygonsOnImage
+from docsim.augmentation.registry import AUGMENTATION_BACKENDS
 
 
 class ImgAugAugmentor:
 
-    SUPPORTED_AUGMENTATIONS = ['grayscale',
-                               'intensity_multiplier',
-                               'additive_gaussian_noise',
-                               'gaussian_blur',
-                               'defocus',
-                               'fog',
-                               'quantization',
-                               'contrast',
-                               'spatter',
-                               'motion_blur',
-                               'perspective_transform',
-                               'elastic_transform',
-                               'piecewise_affine']
+    SUPPORTED_AUGMENTATIONS = AUGMENTATION_BACKENDS[__name__ + '.ImgAugAugmentor']
 
     def __init__(self, main_config):
         self.shuffle = main_config.shuffle
@@ -75,15 +63,14 @@ class ImgAugAugmentor:
 
         return
     
-    def augment_image(self, img, gt, completed_groups):
+    def augment_image(self, img, points, gt, completed_groups):
         # Note: Running as groups directly is cheaper than running individually using run_augment()
         
         if self.shuffle:  # TODO: Move to top-level augmentor?
             random.shuffle(self.augmentors)
 
-        polygons = [Polygon(element['points'], element['label'])
-                    for element in gt["data"]]
-        polygons = PolygonsOnImage(polygons, shape=img.shape)
+        # All the corners as the keypoints of a single image, instead of a Polygon per element
+        keypoints = points.reshape(1, -1, 2)
         
         for aug in self.augmentors:
             if random.random() < aug.p and len(gt["augs_done"]) < self.max_augmentations_per_image:
@@ -93,28 +80,15 @@ class ImgAugAugmentor:
                     else:
                         completed_groups.update(self.augname2groups[aug.name])
                 
-                img, polygons = aug(image=img, polygons=polygons)
+                img, keypoints = aug(image=img, keypoints=keypoints)
                 gt["augs_done"].append(aug.name)
         
-        # Put back polygons into GT
-        for element, pg in zip(gt["data"], polygons):
-            element['points'] = [pt.tolist() for pt in pg.exterior]
-
-        return img, gt
+        return img, keypoints.reshape(points.shape)
     
     @staticmethod
-    def run_augment(aug, img, gt):
-        polygons = [Polygon(element['points'], element['label'])
-                    for element in gt]
-        polygons = PolygonsOnImage(polygons, shape=img.shape)
-        
-        img, polygons = aug(image=img, polygons=polygons)
-        
-        # Put back polygons into GT
-        for element, pg in zip(gt, polygons):
-            element['points'] = [pt.tolist() for pt in pg.exterior]
-        
-        return img, gt
+    def run_augment(aug, img, points):
+        img, keypoints = aug(image=img, keypoints=points.reshape(1, -1, 2))
+        return img, keypoints.reshape(points.shape)
 
 ## -------------------- Augmentors --------------------- ##
 
@@ -124,14 +98,14 @@ class VariableRangeAdditiveGaussianNoise:
         self.max_upper_scale = max_scale*255.0
         self.upper_range = self.max_upper_scale - self.min_upper_scale
     
-    def __call__(self, image, polygons=None):
+    def __call__(self, image, keypoints=None):
         upper_scale = (random.random() * self.upper_range) + self.min_upper_scale
         aug = iaa.AdditiveGaussianNoise(scale=(0, upper_scale))
-        return aug(image=image), polygons
+        return aug(image=image), keypoints
 
 class ElasticTransformCorruption:
     def __init__(self, severity=2):
         self.aug = iaa.imgcorruptlike.ElasticTransform(severity)
     
-    def __call__(self, image, polygons=None):
-        return self.aug(image=image), polygons
+    def __call__(self, image, keypoints=None):
+        return self.aug(image=image), keypoints
@@ -1,18 +1,14 @@
 import ocrodeg
 import random
 import numpy as np
+import cv2
 from docsim.utils.image import rgb2gray
+from docsim.utils.warp import get_coarse_grid, get_displacement_maps, remap
+from docsim.augmentation.registry import AUGMENTATION_BACKENDS
 
 class OCRoDegAugmentor:
     
-    SUPPORTED_AUGMENTATIONS = [
-        'gaussian_warp',
-        '1d_surface_distort',
-        'binarized_blur',
-        'blotches',
-        'multiscale_black_noise',
-        'fibrous_noise'
-    ]
+    SUPPORTED_AUGMENTATIONS = AUGMENTATION_BACKENDS[__name__ + '.OCRoDegAugmentor']
     
     def __init__(self, main_config):
         self.shuffle = main_config.shuffle
@@ -53,7 +49,7 @@ class OCRoDegAugmentor:
         
         return
     
-    def augment_image(self, img, gt, completed_groups):
+    def augment_image(self, img, points, gt, completed_groups):
         if self.shuffle: # TODO: Move to top-level augmentor?
             random.shuffle(self.augmentors)
             
@@ -67,11 +63,12 @@ class OCRoDegAugmentor:
                 img = aug(image=img)
                 gt["augs_done"].append(aug.name)
         
-        return img, gt
+        # The points are left as is, like ocrodeg does not move them along with its warps
+        return img, points
     
     @staticmethod
-    def run_augment(aug, img, gt):
-        return aug(image=img), gt
+    def run_augment(aug, img, points):
+        return aug(image=img), points
 
 
 ## -------------------- Augmentors --------------------- ##
@@ -86,15 +83,19 @@ class GaussianWarp:
     def __call__(self, image):
         sigma = random.random() * self.sigma_range + self.sigma[0]
         maxdel = random.random() * self.maxdelta_range + self.maxdelta[0]
-        noise = ocrodeg.bounded_gaussian_noise(image.shape[:2], sigma=sigma, maxdelta=maxdel)
         
-        if len(image.shape) == 2:
-            return ocrodeg.distort_with_noise(image, noise)
-        
-        for i in range(image.shape[-1]):
-            image[:,:,i] = ocrodeg.distort_with_noise(image[:,:,i], noise.copy())
-        
-        return image
+        # Like ocrodeg.bounded_gaussian_noise(), but as the noise is smooth over about sigma pixels,
+        # it's generated on a grid that much coarser, and only upsampled while remapping
+        step = max(1, int(sigma / 2))
+        node_ys, node_xs = get_coarse_grid(image.shape[:2], step)
+        noise = np.random.rand(len(node_ys), len(node_xs), 2).astype(np.float32)
+        noise = cv2.GaussianBlur(noise, (0, 0), sigma / step, borderType=cv2.BORDER_REFLECT)
+        noise -= noise.min()
+        noise /= noise.max()
+        noise = (2*noise - 1) * maxdel
+        
+        # All the channels at once, like ocrodeg.distort_with_noise() does for each one
+        return remap(image, get_displacement_maps(noise, step))
 
 class RuledSurface1dDistort:
     def __init__(self, magnitude=(15.0, 40.0)):
@@ -103,15 +104,19 @@ class RuledSurface1dDistort:
     
     def __call__(self, image):
         mag = random.random() * self.magnitude_range + self.magnitude[0]
-        noise = ocrodeg.noise_distort1d(image.shape[:2], magnitude=mag)
         
-        if len(image.shape) == 2:
-            return ocrodeg.distort_with_noise(image, noise)
+        # Like ocrodeg.noise_distort1d(), the pixels only move vertically, by a smooth noise across the columns:
+        # so a single row of it is generated, instead of the full field
+        noise = np.random.randn(1, image.shape[1]).astype(np.float32)
+        noise = cv2.GaussianBlur(noise, (0, 0), 100.0, borderType=cv2.BORDER_REFLECT)
+        noise *= mag / np.abs(noise).max()
         
-        for i in range(image.shape[-1]):
-            image[:,:,i] = ocrodeg.distort_with_noise(image[:,:,i], noise.copy())
+        def get_maps(y0, y1, x0, x1):
+            xs = np.tile(np.arange(x0, x1, dtype=np.float32), (y1 - y0, 1))
+            ys = noise[:, x0:x1] + np.arange(y0, y1, dtype=np.float32)[:, None]
+            return xs, ys
         
-        return image
+        return remap(image, get_maps)
 
 class BinarizedBlur:
     def __init__(self, sigma=(0.0,2.0)):
@@ -0,0 +1,52 @@
+import importlib
+
+# The augmentations implemented by each backend class, in the order the backends are applied.
+# A backend module (and its heavy dependencies) is only imported when a config uses one of its augmentations.
+AUGMENTATION_BACKENDS = {
+    'docsim.augmentation.img_aug.ImgAugAugmentor': [
+        'grayscale',
+        'intensity_multiplier',
+        'additive_gaussian_noise',
+        'gaussian_blur',
+        'defocus',
+        'fog',
+        'quantization',
+        'contrast',
+        'spatter',
+        'motion_blur',
+        'perspective_transform',
+        'elastic_transform',
+        'piecewise_affine'
+    ],
+    'docsim.augmentation.ocr_deg.OCRoDegAugmentor': [
+        'gaussian_warp',
+        '1d_surface_distort',
+        'binarized_blur',
+        'blotches',
+        'multiscale_black_noise',
+        'fibrous_noise'
+    ],
+    'docsim.augmentation.albumentations.Albumentor': [
+        'image_compression',
+        'posterize',
+        'blur',
+        'median_blur',
+        'iso_noise'
+    ],
+    'docsim.augmentation.custom_augs.CustomAugmentations': [
+        'creases_and_curls',
+    ],
+}
+
+SUPPORTED_AUGMENTATIONS = [aug_name for aug_names in AUGMENTATION_BACKENDS.values() for aug_name in aug_names]
+
+def load_backends(aug_names):
+    '''
+    Import the backend classes implementing any of the given augmentations
+    '''
+    backends = []
+    for backend_path, backend_augs in AUGMENTATION_BACKENDS.items():
+        if set(backend_augs).intersection(aug_names):
+            module_name, class_name = backend_path.rsplit('.', 1)
+            backends.append(getattr(importlib.import_module(module_name), class_name))
+    return backends
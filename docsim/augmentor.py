@@ -1,38 +1,41 @@
 import os
+import sys
+import multiprocessing
 from glob import glob
 from tqdm import tqdm
 import json
 import random
-import cv2
+from copy import deepcopy
 import numpy as np
 from imageio import imread, imsave
-from joblib import Parallel, delayed
 
-from docsim.augmentation.img_aug import ImgAugAugmentor
-from docsim.augmentation.ocr_deg import OCRoDegAugmentor
-from docsim.augmentation.albumentations import Albumentor
-from docsim.augmentation.custom_augs import CustomAugmentations
+from docsim.augmentation import registry
 
 from docsim.utils.image import get_all_images
+from docsim.utils.random import get_worker_seed
+from docsim.utils.workers import get_num_workers, get_chunk_size
+from docsim.utils.sinks import FolderSink, encode_sample
+from docsim.utils.ground_truth import read_ground_truths, get_points, set_points
 
   
 class Augmentor:
 
-    SUPPORTED_AUGMENTATIONS = ImgAugAugmentor.SUPPORTED_AUGMENTATIONS + \
-        OCRoDegAugmentor.SUPPORTED_AUGMENTATIONS + \
-        Albumentor.SUPPORTED_AUGMENTATIONS + CustomAugmentations.SUPPORTED_AUGMENTATIONS
+    SUPPORTED_AUGMENTATIONS = registry.SUPPORTED_AUGMENTATIONS
 
     class AugmentCounter:
         def __init__(self, value):
             self.value = value
             
     def __init__(self, config_json):
-        with open(config_json, encoding='utf-8') as f:
-            config = json.load(f)
+        if type(config_json) == dict:
+            config = deepcopy(config_json)
+        else:
+            with open(config_json, encoding='utf-8') as f:
+                config = json.load(f)
         self.setup_defaults(config)
         # TODO: Fix the impurity below
-        augmentors = [ImgAugAugmentor(self), OCRoDegAugmentor(
-            self), Albumentor(self), CustomAugmentations(self)]
+        # Only the backends used by the config get imported
+        augmentors = [backend(self) for backend in registry.load_backends(self.augmentations)]
         self.augmentors = [a for a in augmentors if a.augmentors]
                 
     def setup_defaults(self, config):
@@ -64,6 +67,7 @@ class Augmentor:
         '''
         Draw polygons on the image
         '''
+        import cv2
         bboxes = [i["points"] for i in gt]
         for bbox in bboxes:
             bbox = np.array(bbox, np.int32).reshape((-1, 1, 2))
@@ -71,22 +75,49 @@ class Augmentor:
                 img, [bbox], color=BOX_COLOR, isClosed=True, thickness=thickness)
             
         return img
+    
+    def seed(self, seed):
+        '''
+        Seed the random streams the augmentations draw from
+        '''
+        random.seed(seed)
+        np.random.seed(seed % 2**32)
+        if 'imgaug' in sys.modules: # Only imported if the config uses it
+            sys.modules['imgaug'].seed(seed % 2**32)
+        return
         
-    def augment(self, image, output_path_prefix):
+    def read_sample(self, image, gt=None):
         '''
-        Augment (once) the given generated sample (image)
-        and write output image and GT with given prefix name
+        Read the given generated sample (image file) as an RGB image array and its GT.
+        The GT is read from the sample's JSON file, unless already given (like from a manifest)
         '''
-        gt_file = os.path.splitext(image)[0] + '.json'
-        if not os.path.isfile(gt_file):
-            print('No GT for:', image)
-            return
+        if gt is None:
+            gt_file = os.path.splitext(image)[0] + '.json'
+            if not os.path.isfile(gt_file):
+                print('No GT for:', image)
+                return None, None
+            with open(gt_file, encoding='utf-8') as f:
+                gt = json.load(f)
 
-        # Read image and GT
+        # Read image
         img = imread(image)[:, :, :3]
-        with open(gt_file, encoding='utf-8') as f:
-            gt = json.load(f)
-            
+        return img, gt
+    
+    def augment_file(self, image, gt=None):
+        '''
+        Augment (once) the given generated sample (image file).
+        Returns the augmented image and its transformed ground truth
+        '''
+        img, gt = self.read_sample(image, gt)
+        if img is None:
+            return None, None
+        return self.augment_sample(img, gt)
+    
+    def augment_sample(self, img, gt):
+        '''
+        Augment (once) the given in-memory sample: an RGB image array and its GT.
+        Returns the augmented image and its transformed ground truth (the given GT is modified)
+        '''
         # To keep track of augmentations done
         gt["augs_done"] = []
         completed_groups = set()
@@ -95,37 +126,134 @@ class Augmentor:
         if self.shuffle:
             random.shuffle(self.augmentors)
         
+        # The corners of all the elements are carried through every backend as a single array,
+        # and only written back into the GT at the end
+        points = get_points(gt)
         for augmentor in self.augmentors:
-            img, gt = augmentor.augment_image(img, gt, completed_groups)
+            img, points = augmentor.augment_image(img, points, gt, completed_groups)
+        set_points(gt, points)
 
         if self.debug:
             img = self.get_image_with_bboxes(img, gt["data"])
         
-        # Save augmented output
-        out_img_file = output_path_prefix + os.path.basename(image)
-        imsave(out_img_file, img)
-        # Write transformed ground truth
-        out_gt_file = output_path_prefix + os.path.basename(gt_file)
-        with open(out_gt_file, 'w', encoding='utf-8') as f:
-            json.dump(gt, f, ensure_ascii=False, indent=4)
-        return
+        return img, gt
+    
+    def augment_variants(self, img, gt, num_variants, name):
+        '''
+        Augment the given in-memory sample into the given number of variants.
+        Yields the (name, image, GT) of each variant as soon as it is augmented, so that only one is held at a time,
+        the names prefixed by the variant (epoch) number
+        '''
+        for v in range(num_variants):
+            # Augmentation modifies the GT in-place
+            variant_img, variant_gt = self.augment_sample(img.copy(), deepcopy(gt))
+            yield '%d-%s' % (v+1, name), variant_img, variant_gt
+    
+    def augment(self, image, sink, epochs=1, gt=None):
+        '''
+        Augment the given generated sample (image) once per epoch, decoding it and reading its GT only once,
+        and write each output image and GT to the sink as soon as it is augmented
+        '''
+        img, gt = self.read_sample(image, gt)
+        if img is None:
+            return []
+        name, ext = os.path.splitext(os.path.basename(image))
+        return [sink.write(key, variant_img, variant_gt, ext[1:])
+                for key, variant_img, variant_gt in self.augment_variants(img, gt, epochs, name)]
+    
+    def augment_and_encode(self, image, epochs=1, gt=None):
+        '''
+        Augment the given generated sample (image) once per epoch, decoding it and reading its GT only once,
+        and return the output names with the encoded output images and GTs (each encoded as soon as it is augmented)
+        '''
+        img, gt = self.read_sample(image, gt)
+        if img is None:
+            return []
+        name, ext = os.path.splitext(os.path.basename(image))
+        return [(key, encode_sample(variant_img, variant_gt, ext[1:]))
+                for key, variant_img, variant_gt in self.augment_variants(img, gt, epochs, name)]
 
-    def __call__(self, input_folder, epochs=1, output_folder=None, num_workers=1):
+    def __call__(self, input_folder, epochs=1, output_folder=None, num_workers=None, sink=None, chunk_size=None):
         '''
-        Bulk augment the generated samples from the given folder
+        Bulk augment the generated samples from the given folder,
+        as files in the output folder or into the given sink.
+        By default, uses as many worker processes as there are cores available.
         '''
-        if not output_folder:
-            output_folder = os.path.join(input_folder, 'augmented')
-        os.makedirs(output_folder, exist_ok=True)
+        if not sink:
+            if not output_folder:
+                output_folder = os.path.join(input_folder, 'augmented')
+            sink = FolderSink(output_folder)
 
         images = get_all_images(input_folder)
         if not images:
-            exit('No images found in:', input_folder)
+            exit('No images found in: %s' % input_folder)
 
-        for e in range(epochs):
-            output_path_prefix = os.path.join(output_folder,str(e+1)+'-')
-            processor = Parallel(n_jobs=num_workers, backend="multiprocessing")
-            processor(delayed(self.augment)(image, output_path_prefix)
-                                                                    for image in tqdm(images))
+        if num_workers is None:
+            num_workers = get_num_workers()
+        
+        if num_workers > 1:
+            self.augment_parallel(input_folder, images, epochs, sink, num_workers, chunk_size)
+        else:
+            gts = read_ground_truths(input_folder)
+            for image in tqdm(images):
+                self.augment(image, sink, epochs, get_gt(gts, image))
+        
+        sink.close()
+        return
+    
+    def augment_parallel(self, input_folder, images, epochs, sink, num_workers, chunk_size=None):
+        '''
+        Augment the images for all the epochs with a single pool of processes, each building its own Augmentor once.
+        The images are sent in chunks, and all the epochs of an image are done at once. Like Generator.generate_parallel(),
+        workers write to the sink if it can be shared, else send back the encoded samples to be written from here.
+        '''
+        worker_sink = sink if sink.parallel_safe else None
+        if not chunk_size:
+            # Unless written by the workers, all the epochs of an image are sent back
+            chunk_size = get_chunk_size(len(images), num_workers, 16, 1 if worker_sink else epochs)
+        chunks = [(images[i:i+chunk_size], epochs, worker_sink) for i in range(0, len(images), chunk_size)]
+        
+        initargs = (self.config, input_folder, np.random.SeedSequence().entropy)
+        with multiprocessing.Pool(num_workers, initializer=init_worker, initargs=initargs) as pool:
+            with tqdm(total=len(images)) as progress_bar:
+                for results in pool.imap_unordered(augment_in_worker, chunks):
+                    if not worker_sink:
+                        for image_results in results:
+                            for key, record in image_results:
+                                sink.write_record(key, record)
+                    # Counts the images once augmented, not once sent
+                    progress_bar.update(len(results))
         return
 
+def get_gt(gts, image):
+    '''
+    GT of the image from the folder's manifest, or None if each sample has its own JSON
+    '''
+    if gts is None:
+        return None
+    # Copied, since augmentation modifies the GT in-place
+    return deepcopy(gts.get(os.path.splitext(os.path.basename(image))[0]))
+
+## ------------------ Multi-process workers ------------------ ##
+
+worker_augmentor, worker_gts = None, None # The Augmentor & GT manifest of the current worker process
+
+def init_worker(config, input_folder, entropy):
+    '''
+    Build the Augmentor for this worker process, read the folder's GT manifest, and seed the RNGs
+    '''
+    global worker_augmentor, worker_gts
+    worker_augmentor = Augmentor(config)
+    worker_augmentor.seed(get_worker_seed(entropy))
+    worker_gts = read_ground_truths(input_folder)
+
+def augment_in_worker(args):
+    images, epochs, sink = args
+    results = []
+    for image in images:
+        gt = get_gt(worker_gts, image)
+        if sink:
+            results.append(worker_augmentor.augment(image, sink, epochs, gt))
+        else:
+            results.append(worker_augmentor.augment_and_encode(image, epochs, gt))
+    return results
@@ -0,0 +1,55 @@
+import random
+import torch.distributed as dist
+from torch.utils.data import IterableDataset, get_worker_info
+from docsim.generator import Generator
+from docsim.utils.random import derive_seed
+
+class GeneratorDataset(IterableDataset):
+    '''
+    Streams freshly generated (image, ground truth) samples from a template into a DataLoader,
+    without writing them to disk. The Generator is built lazily inside each worker process.
+
+    The indices of the run are split between all the dataloader workers (of all the distributed
+    ranks, if any), so that each sample is produced exactly once per epoch. With a seed, the sample
+    at index i is the same as the one generate.py writes for i. Without a seed, every worker
+    draws from its own random stream, and the stream is endless if num_samples is None.
+
+    The ground truths have a varying number of elements, so either pass a transform(image, gt)
+    to turn them into targets, or a collate_fn to the DataLoader.
+    '''
+    def __init__(self, template_json, num_samples=None, seed=None, start_index=0, as_numpy=True, transform=None):
+        self.template_json = template_json
+        self.num_samples = num_samples
+        self.seed = seed
+        self.start_index = start_index
+        self.as_numpy = as_numpy
+        self.transform = transform
+        self.generator = None
+
+    @staticmethod
+    def get_shard():
+        '''
+        Returns the shard of the current worker, and the total number of shards
+        '''
+        rank, world_size = 0, 1
+        if dist.is_available() and dist.is_initialized():
+            rank, world_size = dist.get_rank(), dist.get_world_size()
+        worker_info = get_worker_info()
+        worker_id, num_workers = (worker_info.id, worker_info.num_workers) if worker_info else (0, 1)
+        return rank * num_workers + worker_id, world_size * num_workers
+
+    def __iter__(self):
+        if not self.generator:
+            self.generator = Generator(self.template_json)
+
+        shard_id, num_shards = self.get_shard()
+        if self.seed is None:
+            # DataLoader seeds its workers differently on every epoch, but the ranks may share that seed
+            worker_info = get_worker_info()
+            worker_seed = worker_info.seed if worker_info else random.getrandbits(64)
+            self.generator.seed(derive_seed(worker_seed, shard_id))
+
+        samples = self.generator.iter_samples(self.num_samples, self.seed, self.start_index,
+                                              num_shards, self.as_numpy, offset=shard_id)
+        for image, gt in samples:
+            yield self.transform(image, gt) if self.transform else (image, gt)
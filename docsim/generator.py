@@ -1,8 +1,18 @@
 import os
 import json
+import random
+import itertools
+import multiprocessing
+from copy import deepcopy
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 from tqdm import tqdm
-from docsim.utils.random import random_id
+from docsim.utils.random import random_id, derive_seed, get_worker_seed
+from docsim.utils.workers import get_chunk_size
+from docsim.utils.text_cache import TextBitmapCache
+from docsim.utils.fonts import get_font
+from docsim.utils.checkpoint import RunCheckpoint
+from docsim.utils.sinks import FolderSink, PipelinedSink, encode_sample
 from docsim.text_generators import *
 from docsim.image_generators import *
 
@@ -11,17 +21,24 @@ class Generator:
         
         if type(template_json) == dict:
             template = template_json
+            # Keep a pristine copy, since setup below fills the dict with fonts & generators
+            self.template_json = deepcopy(template_json)
         else:
             with open(template_json, encoding='utf-8') as f:
                 template = json.load(f)
+            self.template_json = template_json
         
         self.doc_name = template['doc_name']
         self.bg_img = template['background_img']
+        with Image.open(self.bg_img) as image:
+            self.bg_mode = image.mode # Only reads the header
         self.DEBUG = template['debug_mode'] if 'debug_mode' in template else False
     
         self.set_defaults(template)
         self.setup_components(template)
         self.setup_static_components(template)
+        self.setup_background()
+        self.setup_text_cache()
     
     def set_defaults(self, template):
         '''
@@ -79,7 +96,7 @@ class Generator:
                 # Setup font based on language
                 if 'font_file' not in component:
                     component['font_file'] = self.default_config['font_files'][component['lang']]
-                component['font'] = ImageFont.truetype(component['font_file'], size=component['font_size'])
+                component['font'] = get_font(component['font_file'], component['font_size'])
                 
                 # Setup the generator using filling method                
                 if component['filler_mode'] == 'random':
@@ -91,7 +108,8 @@ class Generator:
                         component['generator'] = ChildNameFromParentGenerator(component['lang'], component['data_source'])
                     elif component['filler_type'] == 'address':
                         component['generator'] = AddressGenerator(
-                            language = component['lang'], type = component['address_type'])
+                            language = component['lang'], type = component['address_type'],
+                            pool_size = component.get('pool_size'))
                     else:
                         raise NotImplementedError
                 elif component['filler_mode'] == 'regex':
@@ -112,13 +130,16 @@ class Generator:
             
             elif component['type'] == 'image':
                 if component['filler_mode'] == 'random':
-                    component['generator'] = ImageGenerator(component['image_folder'], component['dims'])
+                    component['generator'] = ImageGenerator(component['image_folder'], component['dims'], self.bg_mode,
+                                                            component.get('pool_memory_mb', 256))
                 elif component['filler_mode'] == 'static':
                     component['generator'] = ImageRetriever(component['image_file'], component['dims'])
                 elif component['filler_mode'] == 'random_face_online':
-                    component['generator'] = OnlineFaceGenerator(component['dims'])
+                    component['generator'] = OnlineFaceGenerator(component['dims'], component.get('url'),
+                                                                 component.get('offline', False),
+                                                                 max_cached=component.get('max_cached', 10000))
                 elif component['filler_mode'] == 'qr':
-                    component['generator'] = QRCodeGenerator(component)
+                    component['generator'] = QRCodeGenerator(component, self.bg_mode)
                 elif component['filler_mode'] == 'barcode':
                     component['generator'] = BarCodeGenerator(component)
                 else:
@@ -153,15 +174,92 @@ class Generator:
     
         return
     
-    def generate_sample(self, output_folder):
+    def setup_background(self):
         '''
-        Generate a random sample and save it
+        Decode the background image once and composite the static (already printed) layer on it.
+        Every sample starts from a copy of this base canvas.
         '''
-        image = Image.open(self.bg_img)
+        with Image.open(self.bg_img) as image:
+            self.background = image.copy()
+        
+        img_draw = ImageDraw.Draw(self.background)
+        for component_name, component in self.components.items():
+            if not component['already_printed']:
+                continue
+            if component['type'] == 'text':
+                if component['split_words']:
+                    component['metadata'] = self.draw_words(img_draw, component)
+                else:
+                    component['metadata'] = [self.draw_text(img_draw, component)]
+            elif component['type'] == 'image':
+                component['metadata'] = [self.draw_img(self.background, component)]
+            else:
+                raise NotImplementedError
+        
+        return
+    
+    def setup_text_cache(self):
+        '''
+        Pre-render the texts of components which can only take a closed set of values
+        '''
+        self.text_cache = TextBitmapCache()
+        for component_name, component in self.components.items():
+            if component['type'] != 'text' or component['already_printed']:
+                continue
+            if component['filler_mode'] not in ['fixed', 'array']:
+                continue
+            
+            align = component["align"] if "align" in component else "left"
+            spacing = component["spacing"] if "spacing" in component else 4
+            for option in component['generator'].options:
+                text = component['post_processor'].process(option)
+                if component['split_words']:
+                    texts = [' '] + text.split()
+                else:
+                    texts = [text]
+                for text in texts:
+                    self.text_cache.pin(text, component['font'], component['font_color'], align, spacing)
+        
+        return
+    
+    def seed(self, seed):
+        '''
+        Reset all the RNGs used for sampling, so that the next sample only depends on the seed
+        '''
+        random.seed(seed)
+        np.random.seed(seed % 2**32)
+        for i, component in enumerate(self.components.values()):
+            # Generators with their own RNG (like Faker)
+            if hasattr(component.get('generator'), 'reseed'):
+                component['generator'].reseed(derive_seed(seed, i))
+        return
+    
+    def prepare(self, num_samples=None, seed=None, entropy=None):
+        '''
+        Set up what the components' generators draw from during a run (like the pools of addresses), before rendering:
+        for a seeded run, from its seed, else from the given entropy (drawn here if None), to be shared by all
+        the components and the worker processes
+        '''
+        if seed is None and entropy is None:
+            entropy = np.random.SeedSequence().entropy
+        self.prepared = (num_samples, seed, entropy)
+        for component in self.components.values():
+            if hasattr(component.get('generator'), 'prepare'):
+                component['generator'].prepare(num_samples, seed, entropy)
+        return
+    
+    def render_sample(self):
+        '''
+        Render a random sample, returns the image and its ground truth
+        '''
+        image = self.background.copy()
         img_draw = ImageDraw.Draw(image)
         ground_truth = []
         for component_name, component in self.components.items():
-            if component['type'] == 'text':
+            if component['already_printed']:
+                # Already drawn on the background, just take its ground truth
+                ground_truth.extend(deepcopy(component['metadata']))
+            elif component['type'] == 'text':
                 if component['split_words']:
                     metadata = self.draw_words(img_draw, component)
                 else:
@@ -173,27 +271,128 @@ class Generator:
             else:
                 raise NotImplementedError
         
-        output_file = os.path.join(output_folder, random_id())
-        image.save(output_file+'.jpg')
         gt = {'doc_name': self.doc_name, 'data': ground_truth}
-        with open(output_file+'.json', 'w', encoding='utf-8') as f:
-            json.dump(gt, f, ensure_ascii=False, indent=4)
+        return image, gt
+    
+    def iter_samples(self, num_samples=None, seed=None, start_index=0, step=1, as_numpy=False, offset=0):
+        '''
+        Yield (image, ground truth) pairs in memory, without writing anything.
+        The samples are those of the run [start_index, start_index+num_samples) (endless if num_samples is None)
+        at indices start_index+offset, start_index+offset+step, ..., so that the run can be split
+        between `step` consumers, each with its own offset.
+        With a seed, each sample is the same as the one generate() would write for its index.
+        '''
+        indices = get_run_indices(num_samples, start_index, step, offset)
+        # Sized by the samples of this consumer
+        self.prepare(len(indices) if num_samples is not None else None, seed)
+        for index in indices:
+            if seed is not None:
+                self.seed(derive_seed(seed, index))
+            image, gt = self.render_sample()
+            yield (np.asarray(image) if as_numpy else image), gt
+    
+    def generate_sample(self, output_folder=None, sink=None, key=None):
+        '''
+        Generate a random sample and save it (to the output folder, or to the given sink)
+        '''
+        if not sink:
+            sink = FolderSink(output_folder)
+        image, gt = self.render_sample()
+        return sink.write(key or random_id(), image, gt)
+    
+    def generate(self, num_samples, output_folder=None, num_workers=1, sink=None, pipeline_threads=0,
+                 seed=None, start_index=0):
+        '''
+        Bulk generate samples, as files in the output folder or into the given sink.
+        With pipeline_threads, the rendered samples are encoded and written by
+        background threads while the next ones are being rendered (single process only).
+        Returns the output paths of the samples, except with tar shards and pipeline_threads,
+        where the shard of a sample isn't known yet when it's queued, so its key is returned instead.
+        
+        With a seed, the run is deterministic and resumable: sample i (for i from start_index)
+        is named by its index and only depends on (seed, i), and the completed samples are
+        recorded in a checkpoint in the output folder, so that a restarted run skips them.
+        Disjoint index ranges of the same run can hence be generated independently.
+        '''
+        if not sink:
+            if not output_folder:
+                output_folder = os.path.join('output', self.doc_name)
+            sink = FolderSink(output_folder)
+        
+        checkpoint, samples = None, num_samples
+        if seed is not None:
+            checkpoint = RunCheckpoint(sink.output_folder, seed)
+            sink.on_commit = checkpoint.commit
+            samples = checkpoint.pending(start_index, start_index + num_samples)
+            if len(samples) < num_samples:
+                print('Resuming: %d of %d samples already done' % (num_samples - len(samples), num_samples))
+        
+        self.prepare(num_samples, seed)
+        if num_workers > 1:
+            output_files = self.generate_parallel(samples, sink, num_workers, seed)
+        else:
+            if pipeline_threads:
+                sink = PipelinedSink(sink, pipeline_threads)
+            output_files = []
+            with tqdm(get_samples(samples, seed), total=num_samples if seed is None else len(samples)) as progress_bar:
+                for key, sample_seed in progress_bar:
+                    if sample_seed is not None:
+                        self.seed(sample_seed)
+                    output_file = self.generate_sample(sink=sink, key=key)
+                    output_files.append(output_file)
+                    if pipeline_threads:
+                        progress_bar.set_postfix(queue=sink.depth, refresh=False)
+            print(TextBitmapCache.summary(self.text_cache.stats()))
         
-        return output_file
+        sink.close()
+        if checkpoint:
+            checkpoint.close()
+        self.close()
+        return output_files
+    
+    def close(self):
+        '''
+        Stop the background work of the components' generators (like prefetching faces)
+        '''
+        for component in self.components.values():
+            if hasattr(component.get('generator'), 'close'):
+                component['generator'].close()
+        return
     
-    def generate(self, num_samples, output_folder=None):
+    def generate_parallel(self, samples, sink, num_workers, seed=None, chunk_size=None):
         '''
-        Bulk generate samples
+        Bulk generate samples using a pool of processes.
+        Each worker builds its own Generator once. If the sink can be shared across processes,
+        workers write to it and only send back the output paths. Otherwise they send back
+        the encoded samples, which get written to the sink from here.
+        The samples are a number of random samples, or the indices to generate for a seeded run.
         '''
-        if not output_folder:
-            output_folder = os.path.join('output', self.doc_name)
-        os.makedirs(output_folder, exist_ok=True)
-        output_files = []
+        num_samples = samples if seed is None else len(samples)
+        if not chunk_size:
+            chunk_size = get_chunk_size(num_samples, num_workers, 64)
+        if seed is None:
+            chunks = [min(chunk_size, num_samples - i) for i in range(0, num_samples, chunk_size)]
+        else:
+            chunks = [samples[i:i+chunk_size] for i in range(0, num_samples, chunk_size)]
         
-        for i in tqdm(range(num_samples)):
-            output_file = self.generate_sample(output_folder)
-            output_files.append(output_file)
+        output_files, cache_stats = [], {}
+        initargs = (self.template_json, np.random.SeedSequence().entropy, self.prepared)
+        with multiprocessing.Pool(num_workers, initializer=init_worker, initargs=initargs) as pool:
+            with tqdm(total=num_samples) as progress_bar:
+                worker_sink = sink if sink.parallel_safe else None
+                tasks = [(chunk, worker_sink, seed) for chunk in chunks]
+                for worker_pid, results, stats in pool.imap_unordered(generate_in_worker, tasks):
+                    if worker_sink:
+                        output_files.extend(results)
+                        # Workers don't get the commit hook, so commit what they wrote from here
+                        sink.on_commit and sink.on_commit([os.path.basename(path) for path in results])
+                    else:
+                        output_files.extend(sink.write_record(key, record) for key, record in results)
+                    cache_stats[worker_pid] = stats
+                    progress_bar.update(len(results))
         
+        total_stats = {key: sum(stats[key] for stats in cache_stats.values()) for key in self.text_cache.stats()}
+        print(TextBitmapCache.summary(total_stats))
         return output_files
     
     def draw_text(self, img_draw, component):
@@ -210,8 +409,7 @@ class Generator:
             text = component['generator'].generate()
             component['last_generated'] = text
             text = component['post_processor'].process(text)
-            img_draw.text((x, y), text, fill=component['font_color'], font=component['font'], align=align, spacing=spacing)
-            width, height = img_draw.textsize(text, font=component['font'])
+            width, height = self.text_cache.draw(img_draw, (x, y), text, component['font'], component['font_color'], align, spacing)
         self.DEBUG and img_draw.rectangle([(x,y), (x+width+1, y+height+1)], outline='rgb(255,0,0)')
         return {
             'type': component['type'],
@@ -286,12 +484,11 @@ class Generator:
             text = component['generator'].generate()
             component['last_generated'] = text
             text = component['post_processor'].process(text)
-            space_width, height  = img_draw.textsize(' ', font=component['font'])
+            space_width, height = self.text_cache.get(' ', component['font'], component['font_color'], align, spacing).size
             for row_num, line in enumerate(text.split('\n')):
                 x, char_index = x_left, 0
                 for col_num, word in enumerate(line.split()):
-                    img_draw.text((x, y), word, fill=component['font_color'], font=component['font'], align=align, spacing=spacing)
-                    w, h  = img_draw.textsize(word, font=component['font'])
+                    w, h = self.text_cache.draw(img_draw, (x, y), word, component['font'], component['font_color'], align, spacing)
                     self.DEBUG and img_draw.rectangle([(x,y), (x+w+1, y+h+1)], outline='rgb(255,0,0)')
                     if h > height: # Variable-height fonts
                         height = h
@@ -328,6 +525,7 @@ class Generator:
         '''
         x, y = component['location']['x_left'], component['location']['y_top']
         width, height = component['dims']['width'], component['dims']['height']
+        details = None
         if not component['already_printed']:
             img, details = component['generator'].generate()
             background.paste(img, (x, y))
@@ -347,3 +545,48 @@ class Generator:
             'height': height,
         }
     
+
+## ------------------ Multi-process workers ------------------ ##
+
+worker_generator = None # The Generator owned by the current worker process
+
+def get_run_indices(num_samples=None, start_index=0, step=1, offset=0):
+    '''
+    The indices of the run [start_index, start_index+num_samples) (endless if num_samples is None)
+    taken by the consumer at the given offset, out of `step` consumers
+    '''
+    if num_samples is None:
+        return itertools.count(start_index + offset, step)
+    return range(start_index + offset, start_index + num_samples, step)
+
+def get_samples(samples, run_seed=None):
+    '''
+    Keys and seeds of a batch of samples: either a number of random samples with unique ids,
+    or the given indices of a seeded run, named by their zero-padded index
+    '''
+    if run_seed is None:
+        return ((random_id(), None) for i in range(samples))
+    return (('%09d' % index, derive_seed(run_seed, index)) for index in samples)
+
+def init_worker(template_json, entropy, prepared):
+    '''
+    Build the Generator for this worker process, prepared for the run like the parent's, and seed its RNG stream
+    '''
+    global worker_generator
+    worker_generator = Generator(template_json)
+    # Also covers the generators with their own RNG (like Faker), which are otherwise cloned by fork
+    worker_generator.seed(get_worker_seed(entropy))
+    # Forked workers inherit the pools built by the parent, others load or build the same
+    worker_generator.prepare(*prepared)
+
+def generate_in_worker(args):
+    samples, sink, run_seed = args
+    results = []
+    for key, sample_seed in get_samples(samples, run_seed):
+        if sample_seed is not None:
+            worker_generator.seed(sample_seed)
+        if sink:
+            results.append(worker_generator.generate_sample(sink=sink, key=key))
+        else:
+            results.append((key, encode_sample(*worker_generator.render_sample())))
+    return os.getpid(), results, worker_generator.text_cache.stats()
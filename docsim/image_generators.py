@@ -2,11 +2,14 @@ from PIL import Image
 import os
 import random
 from random import randrange
-import requests
 import io
+from collections import OrderedDict
 
 from docsim.utils.random import random_string
 from docsim.utils.image import *
+from docsim.utils.image_pool import ImagePool
+from docsim.utils.face_prefetcher import FacePrefetcher
+from docsim.utils.cache import CACHE_DIR
 
 class ImageRetriever:
     def __init__(self, img_path, dims):
@@ -18,34 +21,53 @@ class ImageRetriever:
         return self.image, self.path
 
 class ImageGenerator:
-    def __init__(self, img_folder, dims):
+    '''
+    Picks random images from a folder. They are decoded & resized once, into a pool
+    in the given mode (of the background) which holds up to `memory_budget_mb` of images.
+    '''
+    def __init__(self, img_folder, dims, mode='RGB', memory_budget_mb=256):
         self.img_size = (dims['width'], dims['height'])
         self.images = get_all_images(img_folder)
         
         if not self.images:
             exit('No images found in %s' % img_folder)
+        self.pool = ImagePool(self.images, self.img_size, mode, memory_budget_mb * 1024**2)
     
     def generate(self):
         img_index = randrange(len(self.images))
         img_path = self.images[img_index]
-        img = Image.open(img_path).resize(self.img_size)
-        return img, img_path
+        return self.pool.get_image(img_index), img_path
 
 class OnlineFaceGenerator:
+    '''
+    Fetches random faces from the given URL, prefetched in background threads
+    and cached on disk, so that they can also be used offline.
+    '''
     URL = 'https://thispersondoesnotexist.com/image'
-    def __init__(self, dims):
+    def __init__(self, dims, url=None, offline=False, num_threads=4, max_cached=10000):
         self.img_size = (dims['width'], dims['height']) if dims else (400, 400)
+        self.prefetcher = FacePrefetcher(url or OnlineFaceGenerator.URL, os.path.join(CACHE_DIR, 'faces'),
+                                         num_threads, max_cached=max_cached, offline=offline)
+    
+    def reseed(self, seed):
+        self.prefetcher.reseed(seed)
+    
+    def close(self):
+        self.prefetcher.close()
     
     def generate(self):
         return self.random_face().resize(self.img_size), None
         
     def random_face(self):
-        r = requests.get(OnlineFaceGenerator.URL).content
-        return Image.open(io.BytesIO(r))
+        return Image.open(io.BytesIO(self.prefetcher.get()))
 
-import qrcode
 class QRCodeGenerator:
-    def __init__(self, details):
+    '''
+    Generates QR codes of random strings (or of the value of the `data_source` component),
+    as images in the given mode. The renders of the last `cache_size` (data, version) pairs are kept,
+    by default only for referential QR codes, since their source values may repeat.
+    '''
+    def __init__(self, details, mode='RGB'):
         if 'string_len_min' not in details:
             details['string_len_min'] = 7
         if 'string_len_max' not in details:
@@ -55,25 +77,37 @@ class QRCodeGenerator:
         if 'version_max' not in details:
             details['version_max'] = 7
 
+        if 'cache_size' not in details:
+            details['cache_size'] = 256 if 'data_source' in details else 0
+
         self.details = details
         self.img_size = (details['dims']['width'], details['dims']['height']) if 'dims' in details else (400, 400)
+        self.mode = mode
+        self.cache = OrderedDict()
     
     def get_data(self):
         if 'data_source' in self.details:
             return self.details['data_source']['last_generated']
         else:
             return random_string(self.details['string_len_min'], self.details['string_len_max'])
+    
+    def render(self, string, version):
+        key = (string, version)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        img = rasterize_qr(get_qr_matrix(string, version), self.img_size, self.mode)
+        if self.details['cache_size']:
+            self.cache[key] = img
+            if len(self.cache) > self.details['cache_size']:
+                self.cache.popitem(last=False)
+        return img
         
     def generate(self):
         string = self.get_data()
         version = random.randint(self.details['version_min'], self.details['version_max'])
-        qr = qrcode.QRCode(version=version, border=0)
-        qr.add_data(string)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        return img.resize(self.img_size), string
+        return self.render(string, version), string
 
-import barcode
 class BarCodeGenerator:
     def __init__(self, details):
         if 'string_len_min' not in details:
@@ -91,11 +125,4 @@ class BarCodeGenerator:
     
     def generate(self):
         data = self.get_data()
-        bar_class = barcode.get_barcode_class('code128')
-        code128 = bar_class(data, barcode.writer.ImageWriter())
-        code128.save('temp', options={"write_text": False, "quiet_zone": 0.5})
-        with Image.open('temp.png') as img:
-            bar_image = img.copy()
-        os.remove('temp.png')
-        resized_bar = bar_image.resize(self.img_size, resample=Image.NEAREST)
-        return resized_bar, data
+        return get_barcode(data, self.img_size), data
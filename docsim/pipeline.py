@@ -0,0 +1,102 @@
+import os
+import multiprocessing
+import numpy as np
+from tqdm import tqdm
+from docsim.generator import Generator
+from docsim.augmentor import Augmentor
+from docsim.utils.random import random_id, get_worker_seed
+from docsim.utils.workers import get_chunk_size
+from docsim.utils.sinks import FolderSink, encode_sample
+
+class Pipeline:
+    '''
+    Generates samples from a template and augments each of them into a number of variants,
+    all in memory: only the augmented samples are encoded and written.
+    '''
+    def __init__(self, template_json, augment_config_json):
+        self.generator = Generator(template_json)
+        self.augmentor = Augmentor(augment_config_json)
+
+    def process_sample(self, num_variants=1, key=None):
+        '''
+        Render a sample and augment it into the given number of variants.
+        Yields the (key, image, GT) of each variant as soon as it is augmented, named like augment.py does.
+        '''
+        key = key or random_id()
+        image, gt = self.generator.render_sample()
+        img = np.array(image.convert('RGB'))
+        return self.augmentor.augment_variants(img, gt, num_variants, key)
+
+    def __call__(self, num_samples, num_variants=1, output_folder=None, num_workers=1, sink=None):
+        '''
+        Bulk generate & augment samples, as files in the output folder or into the given sink
+        '''
+        if not sink:
+            if not output_folder:
+                output_folder = os.path.join('output', self.generator.doc_name, 'augmented')
+            sink = FolderSink(output_folder)
+
+        self.generator.prepare(num_samples)
+        if num_workers > 1:
+            output_files = self.run_parallel(num_samples, num_variants, sink, num_workers)
+        else:
+            output_files = []
+            for i in tqdm(range(num_samples)):
+                for key, img, gt in self.process_sample(num_variants):
+                    output_files.append(sink.write(key, img, gt))
+
+        sink.close()
+        return output_files
+
+    def run_parallel(self, num_samples, num_variants, sink, num_workers, chunk_size=None):
+        '''
+        Bulk generate & augment samples using a pool of processes, each with its own Pipeline.
+        Like Generator.generate_parallel(), workers write to the sink if it can be shared,
+        else send back the encoded variants to be written from here.
+        '''
+        worker_sink = sink if sink.parallel_safe else None
+        if not chunk_size:
+            # Unless written by the workers, all the variants of a sample are sent back
+            chunk_size = get_chunk_size(num_samples, num_workers, 16, 1 if worker_sink else num_variants)
+        chunks = [min(chunk_size, num_samples - i) for i in range(0, num_samples, chunk_size)]
+
+        output_files = []
+        initargs = (self.generator.template_json, self.augmentor.config, np.random.SeedSequence().entropy,
+                    self.generator.prepared)
+        with multiprocessing.Pool(num_workers, initializer=init_worker, initargs=initargs) as pool:
+            with tqdm(total=num_samples) as progress_bar:
+                tasks = [(n, num_variants, worker_sink) for n in chunks]
+                for results, n in pool.imap_unordered(process_in_worker, tasks):
+                    if worker_sink:
+                        output_files.extend(results)
+                    else:
+                        output_files.extend(sink.write_record(key, record) for key, record in results)
+                    progress_bar.update(n)
+        return output_files
+
+## ------------------ Multi-process workers ------------------ ##
+
+worker_pipeline = None # The Pipeline owned by the current worker process
+
+def init_worker(template_json, augment_config, entropy, prepared):
+    '''
+    Build the Pipeline for this worker process and seed its RNG streams
+    '''
+    global worker_pipeline
+    seed = get_worker_seed(entropy)
+    worker_pipeline = Pipeline(template_json, augment_config)
+    worker_pipeline.generator.prepare(*prepared)
+    # Also covers the generators with their own RNG (like Faker), which are otherwise cloned by fork
+    worker_pipeline.generator.seed(seed)
+    worker_pipeline.augmentor.seed(seed)
+
+def process_in_worker(args):
+    num_samples, num_variants, sink = args
+    results = []
+    for i in range(num_samples):
+        for key, img, gt in worker_pipeline.process_sample(num_variants):
+            if sink:
+                results.append(sink.write(key, img, gt))
+            else:
+                results.append((key, encode_sample(img, gt)))
+    return results, num_samples
@@ -3,13 +3,15 @@ class TextGeneratorBase:
     def generate(self):
         return 'ERROR'
 
-from rstr import xeger
 class TextFromRegexGenerator(TextGeneratorBase):
     def __init__(self, regex):
+        from docsim.utils.regex_sampler import RegexSampler
+        # Parsed once, instead of on every sample
+        self.sampler = RegexSampler(regex)
         self.pattern = regex
     
     def generate(self):
-        return xeger(self.pattern)
+        return self.sampler.sample()
 
 class TextFromArrayGenerator(TextGeneratorBase):
     def __init__(self, array):
@@ -18,9 +20,14 @@ class TextFromArrayGenerator(TextGeneratorBase):
     def generate(self):
         return random.choice(self.options)
 
+import numpy as np
 from docsim.utils.lang import EnglishCharacters, LanguageCharacters
 class NameGenerator(TextGeneratorBase):
-    def __init__(self, lang='en'):
+    '''
+    Random names from the letters of a language.
+    Names are drawn in batches as NumPy arrays of code points, into a buffer consumed by generate().
+    '''
+    def __init__(self, lang='en', batch_size=1024):
         if lang == 'en':
             self.charset = EnglishCharacters()
             self.title_case = True
@@ -28,67 +35,142 @@ class NameGenerator(TextGeneratorBase):
             self.charset = LanguageCharacters(lang)
             self.title_case = False
         
+        self.consonant_codes = to_codes(self.charset.consonants)
+        self.vowel_codes = to_codes(self.charset.vowels)
+        self.combination_codes = None
         if hasattr(self.charset, 'letter_combinations'):
-            self.random_length_name = self.random_length_name_from_combinations
+            self.combination_codes = to_codes(self.charset.letter_combinations)
+        
+        self.batch_size = batch_size
+        self.reseed(random.getrandbits(64))
     
-    def generate(self, min_len=5, max_len=5):
-        return self.random_name(min_len, max_len)
+    def reseed(self, seed):
+        self.rng = np.random.default_rng(seed)
+        self.buffer = []
+        # Refills ramp up from 1 to the batch size, so that frequent reseeding (once per sample) draws no more than needed
+        self.refill_size = 1
     
-    def random_length_name_from_combinations(self, length=5):
-        return ''.join(random.choice(self.charset.letter_combinations) for i in range(length))
+    def next_from_buffer(self):
+        if not self.buffer:
+            self.buffer = self.draw_batch(self.refill_size)
+            self.refill_size = min(2 * self.refill_size, self.batch_size)
+        return self.buffer.pop()
+    
+    def draw_batch(self, count):
+        return self.random_names(count, 5, 6)
+    
+    def generate(self):
+        return self.next_from_buffer()
+    
+    def random_letters(self, count, length):
+        '''
+        Code points of `count` random letter sequences, as a (count, length, letter width) array.
+        Consonants & vowels alternate, unless the language has a set of letter combinations.
+        '''
+        if self.combination_codes is not None:
+            return self.combination_codes[self.rng.integers(len(self.combination_codes), size=(count, length))]
+        
+        letters = np.empty((count, length, 1), dtype=np.uint32)
+        letters[:, 0::2, 0] = self.consonant_codes[self.rng.integers(len(self.consonant_codes), size=(count, (length+1)//2)), 0]
+        letters[:, 1::2, 0] = self.vowel_codes[self.rng.integers(len(self.vowel_codes), size=(count, length//2)), 0]
+        return letters
+    
+    def random_name_codes(self, count, min_length=5, max_length=5):
+        '''
+        Code points of a batch of names with random lengths in [min_length, max_length), padded with 0
+        '''
+        lengths = self.rng.integers(min_length, max_length, size=count)
+        letters = self.random_letters(count, max_length-1)
+        letters[np.arange(max_length-1) >= lengths[:, None]] = 0
+        return letters.reshape(count, -1)
+    
+    def random_names(self, count, min_length=5, max_length=5):
+        return to_strings(self.random_name_codes(count, min_length, max_length))
     
-    def random_length_name(self, length=5):
-        return ''.join(random.choice((self.charset.consonants, self.charset.vowels)[i%2]) for i in range(length))
-
     def random_name(self, min_length=5, max_length=5):
-        length = random.randrange(min_length, max_length)
-        return self.random_length_name(length)
+        return self.random_names(1, min_length, max_length)[0]
+    
+    def random_initial_codes(self, count):
+        '''
+        Code points of a batch of initials like 'A.', with a 25% chance of 2 (and then 40% of 3) initials
+        '''
+        u = self.rng.random((count, 2))
+        num_initials = 1 + (u[:, 0] < 0.25) + ((u[:, 0] < 0.25) & (u[:, 1] < 0.4))
+        
+        # Laid out as 'C. C. C.', then cut to the number of initials
+        codes = np.zeros((count, 3, 3), dtype=np.uint32)
+        codes[:, :, 0] = self.consonant_codes[self.rng.integers(len(self.consonant_codes), size=(count, 3)), 0]
+        codes[:, :, 1] = ord('.')
+        codes[:, :2, 2] = ord(' ')
+        codes = codes.reshape(count, 9)
+        codes[np.arange(9) >= (3 * num_initials - 1)[:, None]] = 0
+        return codes
             
 class FullNameGenerator(NameGenerator):
     
-    def generate(self):
-        return self.random_fullname()
+    def draw_batch(self, count):
+        return self.random_fullnames(count)
     
     def random_fullname(self):
-        first_name = self.random_name(5, 7)
-        
-        initial = random.choice(self.charset.consonants) + '.'
-        if random.random() < 0.25:
-            # Two initials
-            initial += ' ' + random.choice(self.charset.consonants) + '.'
-            if random.random() < 0.4:
-                # Three initials
-                initial += ' ' + random.choice(self.charset.consonants) + '.'
+        return self.random_fullnames(1)[0]
+    
+    def random_fullname_codes(self, count):
+        '''
+        Code points of a batch of full names, padded with 0 (also in between the words)
+        '''
+        first_names = self.random_name_codes(count, 5, 7)
+        initials = self.random_initial_codes(count)
+        middle_names = self.random_name_codes(count, 4, 7)
+        last_names = self.random_name_codes(count, 6, 8)
+        u = self.rng.random((count, 3))
         
-        middle_name = self.random_name(4, 7)
-        last_name = self.random_name(6, 8)
-        
-        # Either add middle name or initial
-        if random.random() > 0.5:
-            if random.random() > 0.5:
-                # Add initial in middle
-                name = first_name + ' ' + initial
-            else:
-                # Add initial at the beginning
-                name = initial + ' ' + first_name
-            
-        else:
-            name = first_name + ' ' + middle_name
+        # Either add middle name or initial (in the middle, or at the beginning)
+        with_initial, initial_first = (u[:, 0] > 0.5)[:, None], (u[:, 1] <= 0.5)[:, None]
+        width = max(first_names.shape[1], initials.shape[1], middle_names.shape[1])
+        first_names, initials, middle_names = pad(first_names, width), pad(initials, width), pad(middle_names, width)
+        first_word = np.where(with_initial & initial_first, initials, first_names)
+        second_word = np.where(with_initial, np.where(initial_first, first_names, initials), middle_names)
         
         # Add last name for majority
-        if random.random() > 0.15:
-            name += ' ' + last_name
-        
-        return name.title() if self.title_case else name
+        with_last_name = (u[:, 2] > 0.15)[:, None]
+        last_word = np.where(with_last_name, last_names, 0)
+        spaces = np.full((count, 1), ord(' '), dtype=np.uint32)
+        return np.hstack([first_word, spaces, second_word, np.where(with_last_name, spaces, 0), last_word])
+    
+    def random_fullnames(self, count):
+        names = to_strings(self.random_fullname_codes(count))
+        return [name.title() for name in names] if self.title_case else names
 
 class MultilineFullNameGenerator(FullNameGenerator):
     
-    def generate(self):
-        full_name = self.random_fullname()
-        if random.random() > 0.3:
-            return full_name
-        else:
-            return full_name + '\n' + self.random_name(6, 8)
+    def draw_batch(self, count):
+        full_names = self.random_fullnames(count)
+        second_lines = self.random_names(count, 6, 8)
+        multiline = self.rng.random(count) <= 0.3
+        return [full_name + '\n' + second_line if is_multiline else full_name
+                for full_name, second_line, is_multiline in zip(full_names, second_lines, multiline)]
+
+def pad(codes, width):
+    return np.pad(codes, ((0, 0), (0, width - codes.shape[1])))
+
+def to_codes(letters):
+    '''
+    Code points of the given letters, as a (number of letters, max letter width) array padded with 0
+    '''
+    width = max(len(letter) for letter in letters)
+    codes = np.zeros((len(letters), width), dtype=np.uint32)
+    for i, letter in enumerate(letters):
+        codes[i, :len(letter)] = [ord(c) for c in letter]
+    return codes
+
+def to_strings(codes):
+    '''
+    Strings from the rows of a 2D array of code points, ignoring 0s
+    '''
+    # Move the 0s to the end of each row (keeping the order of the letters), where they get stripped
+    order = np.argsort(codes == 0, axis=1, kind='stable')
+    codes = np.ascontiguousarray(np.take_along_axis(codes, order, axis=1), dtype='<u4')
+    return codes.view('<U%d' % codes.shape[1]).ravel().tolist()
 
 class ChildNameFromParentGenerator(MultilineFullNameGenerator):
     def __init__(self, lang, src_component):
@@ -128,14 +210,21 @@ class ReferentialTextGenerator(TextGeneratorBase):
     def generate(self):
         return self.src_component['last_generated']
 
-from docsim.utils.transliterator import Transliterator
 class ReferentialTextTransliterator(ReferentialTextGenerator):
     def __init__(self, src_lang, dest_lang, src_component):
         super().__init__(src_component)
+        from docsim.utils.transliterator import Transliterator
         self.transliterator = Transliterator(src_lang, dest_lang)
+        self.prefetched_buffer = None
         
     def generate(self):
-        return self.transliterator.transliterate(super().generate())
+        text = super().generate()
+        # When the source has drawn a new batch of texts ahead of time, transliterate them all at once
+        src_buffer = getattr(self.src_component['generator'], 'buffer', None)
+        if src_buffer and src_buffer is not self.prefetched_buffer:
+            self.transliterator.transliterate_batch([text] + src_buffer)
+            self.prefetched_buffer = src_buffer
+        return self.transliterator.transliterate(text)
 
 class TextPostProcessor():
     def __init__(self, upper_case=False, lower_case=False,
@@ -154,27 +243,46 @@ class TextPostProcessor():
             text = text.split('\n')[0]
         return text
 
-from faker import Faker
 class AddressGenerator():
+    '''
+    Draws addresses (or parts of them) from a pool pre-generated with Faker for the run, in batches
+    (exposed as `buffer`, so that they can be processed ahead of time)
+    '''
     LANG2CODE = {
         'en' : 'en-US',
         'hi': 'hi_IN'
     }
-    def __init__(self, language='en', type="full"):
-        lang_code = AddressGenerator.LANG2CODE[language]
-        self.faker = Faker(lang_code)
+    TYPE2METHOD = {
+        'full': 'address',
+        'street_address': 'street_address',
+        'city': 'city',
+        'country': 'country',
+        'postcode': 'postcode',
+    }
+    def __init__(self, language='en', type="full", pool_size=None, batch_size=64):
+        if type not in AddressGenerator.TYPE2METHOD:
+            raise NotImplementedError
+        self.lang_code = AddressGenerator.LANG2CODE[language]
+        self.method = AddressGenerator.TYPE2METHOD[type]
+        self.pool_size = pool_size # Else sized with the run
+        self.pool = None
         self.type = type
+        self.batch_size = batch_size
+        self.reseed(random.getrandbits(64))
+    def reseed(self, seed):
+        self.rng = np.random.default_rng(seed)
+        self.buffer = []
+        # Like NameGenerator, ramp up the batches after reseeding
+        self.refill_size = 1
+    def prepare(self, num_samples=None, seed=None, entropy=None):
+        from docsim.utils.address_pool import get_address_pool
+        self.pool = get_address_pool(self.lang_code, self.method, num_samples, seed, entropy, self.pool_size)
     def generate(self):
-        if self.type == "full":
-            return self.faker.address()
-        if self.type == "street_address":
-            return self.faker.street_address()
-        elif self.type == "city":
-            return self.faker.city()
-        elif self.type == "country":
-            return self.faker.country()
-        elif self.type == "postcode":
-            return self.faker.postcode()
-        else:
-            raise NotImplementedError
+        if not self.buffer:
+            if self.pool is None: # Not prepared for a run
+                self.prepare()
+            indices = self.rng.integers(len(self.pool), size=self.refill_size)
+            self.buffer = [self.pool[i] for i in indices]
+            self.refill_size = min(2 * self.refill_size, self.batch_size)
+        return self.buffer.pop()
             
@@ -0,0 +1,108 @@
+import os
+import numpy as np
+from tqdm import tqdm
+from docsim.utils.cache import CACHE_DIR, save_to_cache
+from docsim.utils.random import derive_seed
+
+# Bump when the way entries are generated changes, to invalidate the pools cached on disk
+ADDRESS_POOL_VERSION = 3
+
+# A pool has up to MAX_POOL_SIZE entries, each only generated when first drawn. Runs which draw from each entry
+# SAMPLES_PER_ENTRY times on average build their pool upfront instead: unseeded runs of enough samples get a pool
+# sized to them (of at least MIN_POOL_SIZE), seeded runs always the largest, since their ranges may be generated
+# separately (with other num_samples), and get it cached on disk
+MIN_POOL_SIZE, MAX_POOL_SIZE = 10000, 100000
+SAMPLES_PER_ENTRY = 4
+
+# Keeps the seeds of the entries apart from those of the samples, derive_seed(run seed, index)
+ENTRY_SEED_KEY = 18
+
+pools = {} # (locale, method, size, seed) -> AddressPool of the current run, inherited by forked workers
+fakers = {} # locale -> Faker, built once per process
+
+def get_faker(locale):
+    if locale not in fakers:
+        from faker import Faker
+        fakers[locale] = Faker(locale)
+    return fakers[locale]
+
+def get_address_pool(locale, method, num_samples=None, seed=None, entropy=None, size=None):
+    '''
+    The pool of a run of num_samples samples (unknown if None): of the run's seed, else of the given entropy
+    (the same in all its worker processes), else of a fresh one. The pools of previous runs are dropped.
+    '''
+    persist = seed is not None
+    if not persist:
+        seed = entropy if entropy is not None else np.random.SeedSequence().entropy
+        if not size and num_samples and num_samples // SAMPLES_PER_ENTRY >= MIN_POOL_SIZE:
+            size = min(MAX_POOL_SIZE, num_samples // SAMPLES_PER_ENTRY)
+    size = size or MAX_POOL_SIZE
+    build = bool(num_samples) and num_samples >= size * SAMPLES_PER_ENTRY
+
+    key = (locale, method, size, seed)
+    if key not in pools:
+        for other_key in [other_key for other_key in pools if other_key[3] != seed]:
+            del pools[other_key]
+        pools[key] = AddressPool(locale, method, size, seed)
+    if build:
+        pools[key].build(persist)
+    return pools[key]
+
+class AddressPool:
+    '''
+    A set of `size` values of a Faker method (like address or city) for a locale, each generated by a Faker
+    seeded from the pool's seed and its index. An entry is generated when first drawn, unless the whole pool was
+    built upfront (before rendering), and has the same value either way. A built pool can also be saved
+    in the cache folder, to be loaded instead of built again.
+    The built entries are stored as one UTF-8 buffer and their offsets in it.
+    '''
+    def __init__(self, locale, method, size, seed, cache_folder=None):
+        self.locale = locale
+        self.method = method
+        self.size = size
+        self.seed = seed
+        self.cache_folder = cache_folder if cache_folder is not None else os.path.join(CACHE_DIR, 'address-pools')
+        self.pool_file = os.path.join(self.cache_folder, 'v%d-%s-%s-%d-%d.npz' % (ADDRESS_POOL_VERSION, locale, method,
+                                                                                 size, seed))
+        self.entries = {} # Generated on demand, until built
+        self.data, self.offsets = None, None
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if self.data is not None:
+            return self.data[self.offsets[index]:self.offsets[index + 1]].tobytes().decode('utf-8')
+        if index not in self.entries:
+            self.entries[index] = self.generate_entry(index)
+        return self.entries[index]
+
+    def generate_entry(self, index):
+        faker = get_faker(self.locale)
+        faker.seed_instance(derive_seed(self.seed, ENTRY_SEED_KEY, index))
+        return getattr(faker, self.method)()
+
+    def build(self, persist=False):
+        if self.data is not None or (persist and self.load()):
+            return
+        entries = [self.entries.get(index) or self.generate_entry(index)
+                   for index in tqdm(range(self.size), desc='Address pool (%s %s)' % (self.locale, self.method),
+                                     leave=False)]
+        entries = [entry.encode('utf-8') for entry in entries]
+        self.offsets = np.cumsum([0] + [len(entry) for entry in entries], dtype=np.int64)
+        self.data = np.frombuffer(b''.join(entries), dtype=np.uint8)
+        self.entries = {}
+        if persist:
+            save_to_cache(self.pool_file, lambda f: np.savez(f, data=self.data, offsets=self.offsets))
+        return
+
+    def load(self):
+        try:
+            with np.load(self.pool_file) as pool:
+                data, offsets = pool['data'], pool['offsets']
+        except (OSError, ValueError, KeyError):
+            return False
+        if len(offsets) != self.size + 1:
+            return False
+        self.data, self.offsets, self.entries = data, offsets, {}
+        return True
@@ -0,0 +1,21 @@
+import os
+import threading
+
+# Root folder of everything DocSim caches on disk across runs (script tables, image & address pools, faces)
+CACHE_DIR = os.environ.get('DOCSIM_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'docsim'))
+
+def save_to_cache(cache_file, write):
+    '''
+    Save a file of the cache, its contents written by write(f) into a binary file.
+    It's written aside and moved in place, since other processes & threads may be saving or reading it at once.
+    Returns whether it was saved (else, it's just not cached)
+    '''
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        temp_file = '%s.%d.%d.tmp' % (cache_file, os.getpid(), threading.get_ident())
+        with open(temp_file, 'wb') as f:
+            write(f)
+        os.replace(temp_file, cache_file)
+        return True
+    except OSError:
+        return False
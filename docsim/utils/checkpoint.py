@@ -0,0 +1,54 @@
+import os
+import json
+import threading
+
+class RunCheckpoint:
+    '''
+    Append-only log of the samples completed by a seeded run in an output folder.
+    The first line records the run's seed, every next line the indices of a batch of samples
+    which were durably written. A restarted run with the same seed skips those indices.
+    '''
+    CHECKPOINT_FILE = 'checkpoint.log'
+
+    def __init__(self, output_folder, run_seed):
+        self.checkpoint_file = os.path.join(output_folder, RunCheckpoint.CHECKPOINT_FILE)
+        self.completed = set()
+        self.lock = threading.Lock() # Writes can be committed from the pipeline threads
+
+        if os.path.isfile(self.checkpoint_file):
+            with open(self.checkpoint_file, encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                if header['seed'] != run_seed:
+                    exit('%s is for a run with seed %d, cannot resume it with seed %d' % (
+                        self.checkpoint_file, header['seed'], run_seed))
+                for line in f:
+                    if line.endswith('\n'): # A line cut by a crash is not a commit
+                        self.completed.update(int(index) for index in line.split())
+            self.log = open(self.checkpoint_file, 'a', encoding='utf-8')
+        else:
+            self.log = open(self.checkpoint_file, 'w', encoding='utf-8')
+            self.log.write(json.dumps({'seed': run_seed}) + '\n')
+            self.log.flush()
+
+    def pending(self, start_index, end_index):
+        '''
+        Indices in [start_index, end_index) which are yet to be generated
+        '''
+        return [index for index in range(start_index, end_index) if index not in self.completed]
+
+    def commit(self, keys):
+        '''
+        Record the samples (named by their index) as complete
+        '''
+        if not keys:
+            return
+        indices = [int(key) for key in keys]
+        with self.lock:
+            self.completed.update(indices)
+            self.log.write(' '.join(str(index) for index in indices) + '\n')
+            self.log.flush()
+        return
+
+    def close(self):
+        self.log.close()
+        return
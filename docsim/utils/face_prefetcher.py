@@ -0,0 +1,149 @@
+import os
+import queue
+import random
+import hashlib
+import threading
+from docsim.utils.cache import save_to_cache
+
+class FacePrefetcher:
+    '''
+    Downloads images ahead of time from a URL which serves a new random image on every request,
+    using a pool of threads sharing one HTTP session, into a bounded queue.
+
+    Every download is also saved in a content-addressed cache folder (named by the SHA-1 of its bytes).
+    Once the cache holds `min_cached` images, they are used whenever no download is ready,
+    so generation is never blocked on the network. Once it holds `max_cached` images, the downloads stop
+    and only the cache is used, like in offline mode.
+
+    Cached images are picked with a private RNG (see reseed()), to leave the global one
+    to the seeded generation, independent of the timing of the threads.
+    '''
+    def __init__(self, url, cache_folder, num_threads=4, queue_size=32, min_cached=100, max_cached=10000,
+                 timeout=10, offline=False):
+        self.url = url
+        self.cache_folder = cache_folder
+        self.num_threads = num_threads
+        self.queue_size = queue_size
+        self.max_cached = max_cached
+        self.min_cached = min(min_cached, max_cached)
+        self.timeout = timeout
+        self.offline = offline
+
+        os.makedirs(cache_folder, exist_ok=True)
+        self.cached_files = sorted(os.path.join(cache_folder, f) for f in os.listdir(cache_folder) if f.endswith('.jpg'))
+        if offline and not self.cached_files:
+            exit('No cached images in %s to use offline' % cache_folder)
+
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.pid, self.error = None, None
+        self.threads = []
+        self.downloads, self.saving = 0, 0
+        self.random, self.random_pid = random.Random(), os.getpid()
+
+    def reseed(self, seed):
+        self.random, self.random_pid = random.Random(seed), os.getpid()
+        return
+
+    def is_full(self):
+        return len(self.cached_files) >= self.max_cached
+
+    def start(self):
+        # Threads don't survive a fork, so every process starts its own on first use
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.queue = queue.Queue(self.queue_size)
+        self.stop_event.clear()
+        if self.is_full():
+            return
+
+        import requests
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.num_threads)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.threads = [threading.Thread(target=self.run_fetcher, daemon=True) for i in range(self.num_threads)]
+        for thread in self.threads:
+            thread.start()
+        return
+
+    def close(self):
+        '''
+        Stop the downloads and wait for the threads to finish
+        '''
+        self.stop_event.set()
+        if self.pid == os.getpid() and self.threads:
+            for thread in self.threads:
+                thread.join()
+            self.threads = []
+            self.session.close()
+        self.pid = None
+        return
+
+    def run_fetcher(self):
+        while not self.stop_event.is_set() and not self.is_full():
+            try:
+                response = self.session.get(self.url, timeout=self.timeout)
+                response.raise_for_status()
+                data = response.content
+                self.save(data)
+                self.error = None
+            except Exception as e:
+                self.error = e
+                self.stop_event.wait(1) # Back off while the server is unreachable
+                continue
+            # Waits for room in the queue, unless stopped meanwhile
+            while not self.stop_event.is_set():
+                try:
+                    self.queue.put(data, timeout=1)
+                    break
+                except queue.Full:
+                    pass
+        return
+
+    def save(self, data):
+        cache_file = os.path.join(self.cache_folder, hashlib.sha1(data).hexdigest() + '.jpg')
+        if os.path.isfile(cache_file):
+            return
+        # A place in the cache is taken before writing, so that concurrent downloads can't go past the limit
+        with self.lock:
+            if len(self.cached_files) + self.saving >= self.max_cached:
+                return
+            self.saving += 1
+        saved = save_to_cache(cache_file, lambda f: f.write(data))
+        with self.lock:
+            self.saving -= 1
+            if saved:
+                self.cached_files.append(cache_file)
+                self.downloads += 1
+        return
+
+    def read_cached(self):
+        # A forked process continues from a copy of the parent's RNG, unless reseeded: start a new one
+        if self.random_pid != os.getpid():
+            self.random, self.random_pid = random.Random(), os.getpid()
+        with open(self.random.choice(self.cached_files), 'rb') as f:
+            return f.read()
+
+    def get(self):
+        '''
+        The bytes of the next image: a fresh download if one is ready, else a cached one
+        (only once enough are cached, unless the downloads are failing)
+        '''
+        if self.offline:
+            return self.read_cached()
+
+        self.start()
+        while True:
+            if self.is_full() and self.queue.empty():
+                return self.read_cached()
+            enough_cached = len(self.cached_files) >= self.min_cached
+            try:
+                return self.queue.get(timeout=0 if enough_cached else 1)
+            except queue.Empty:
+                if enough_cached or (self.error and self.cached_files):
+                    return self.read_cached()
+                if self.error:
+                    raise self.error
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from PIL import ImageFont
+
+fonts = {} # (font file, size) -> font, shared by all the Generators of the process
+font_metrics = {} # (font file, size) -> FontMetrics
+
+def get_font(font_file, size):
+    '''
+    The font of the given file & size, loaded once per process
+    '''
+    key = (font_file, size)
+    if key not in fonts:
+        fonts[key] = ImageFont.truetype(font_file, size=size)
+    return fonts[key]
+
+def get_font_metrics(font):
+    key = (font.path, font.size)
+    if key not in font_metrics:
+        font_metrics[key] = FontMetrics(font)
+    return font_metrics[key]
+
+class FontMetrics:
+    '''
+    Cache of the measurements of texts (like words) in a font. Each text is laid out once,
+    by a single getbbox() call, which also gives the size that ImageDraw.textsize()
+    (removed in Pillow 10) used to return.
+    '''
+    def __init__(self, font, max_size=65536):
+        self.font = font
+        self.max_size = max_size
+        self.bboxes = OrderedDict()
+
+    def get_bbox(self, text):
+        '''
+        Bounding box of a line of text drawn at (0, 0), like ImageDraw.textbbox()
+        '''
+        if text in self.bboxes:
+            self.bboxes.move_to_end(text)
+            return self.bboxes[text]
+        bbox = self.bboxes[text] = self.font.getbbox(text)
+        if len(self.bboxes) > self.max_size:
+            self.bboxes.popitem(last=False)
+        return bbox
+
+    def get_size(self, text, spacing=4):
+        '''
+        Size of the text, as given by ImageDraw.textsize() (in Pillow < 10):
+        the width excludes the left bearing, the height counts from the top of the line
+        '''
+        if '\n' in text:
+            lines = text.split('\n')
+            line_spacing = self.get_size('A')[1] + spacing
+            return max(self.get_size(line)[0] for line in lines), len(lines) * line_spacing - spacing
+        left, top, right, bottom = self.get_bbox(text)
+        return right - left, bottom
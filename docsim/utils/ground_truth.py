@@ -0,0 +1,271 @@
+import os
+import json
+import numpy as np
+
+JSONL_MANIFEST = 'ground_truth.jsonl'
+COLUMNAR_MANIFEST = 'ground_truth.npz'
+
+## ------------------ Compact representation ------------------ ##
+
+def compact_element(element):
+    '''
+    Replace the 4 corner points, width and height of an element by a single [x, y, w, h] box
+    if it is axis-aligned, else by its flattened points and size
+    '''
+    compact = {}
+    for key, value in element.items():
+        if key in ['width', 'height']:
+            continue
+        if key != 'points':
+            compact[key] = value
+            continue
+        (x1, y1), (x2, y2), (x3, y3), (x4, y4) = value
+        w, h = element['width'], element['height']
+        if (x2, y2, x3, y3, x4, y4) == (x1+w, y1, x1+w, y1+h, x1, y1+h):
+            compact['box'] = [x1, y1, w, h]
+        else:
+            compact['quad'] = [x1, y1, x2, y2, x3, y3, x4, y4]
+            compact['size'] = [w, h]
+    return compact
+
+def expand_element(compact):
+    '''
+    Inverse of compact_element()
+    '''
+    element = {}
+    for key, value in compact.items():
+        if key == 'box':
+            x, y, w, h = value
+            element['points'] = [[x, y], [x+w, y], [x+w, y+h], [x, y+h]]
+            element['width'], element['height'] = w, h
+        elif key == 'quad':
+            element['points'] = [value[i:i+2] for i in range(0, 8, 2)]
+            element['width'], element['height'] = compact['size']
+        elif key != 'size':
+            element[key] = value
+    return element
+
+def compact_gt(gt):
+    return {key: [compact_element(e) for e in value] if key == 'data' else value for key, value in gt.items()}
+
+def expand_gt(compact):
+    return {key: [expand_element(e) for e in value] if key == 'data' else value for key, value in compact.items()}
+
+## ------------------ Points array ------------------ ##
+
+def get_points(gt):
+    '''
+    The 4 corner points of all the elements of the GT, as an N x 4 x 2 float32 array
+    '''
+    return np.array([element['points'] for element in gt['data']], dtype=np.float32).reshape(-1, 4, 2)
+
+def set_points(gt, points):
+    '''
+    Inverse of get_points(): write the N x 4 x 2 array back as the points of the GT's elements
+    '''
+    for element, element_points in zip(gt['data'], points.tolist()):
+        element['points'] = element_points
+    return gt
+
+## ------------------ Writers ------------------ ##
+
+class JsonGTWriter:
+    '''
+    Writes the GT of each sample into its own <key>.json file
+    '''
+    parallel_safe = True
+    durable = True # A GT is on disk as soon as it's written
+
+    def __init__(self, output_folder):
+        self.output_folder = output_folder
+
+    def write(self, key, gt):
+        with open(os.path.join(self.output_folder, key + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(gt, f, ensure_ascii=False, indent=4)
+        return
+
+    def close(self):
+        return
+
+class JsonlGTWriter:
+    '''
+    Appends the compact GT of each sample as a line in a single manifest
+    '''
+    parallel_safe = False
+    durable = True
+
+    def __init__(self, manifest_file):
+        # Line buffered, so that every written GT reaches the file
+        self.manifest = open(manifest_file, 'a', encoding='utf-8', buffering=1)
+
+    def write(self, key, gt):
+        line = dict(name=key, **compact_gt(gt))
+        self.manifest.write(json.dumps(line, ensure_ascii=False, separators=(',', ':')) + '\n')
+        return
+
+    def close(self):
+        self.manifest.close()
+        return
+
+class ColumnarGTWriter:
+    '''
+    Collects the GT of all the samples of a run into NumPy arrays, saved as a .npz at the end:
+    the points (N x 4 x 2) and sizes (N x 2) of all the N elements, with each sample's
+    range of elements given by `offsets` (stored as float64, to read back the same values as the JSON GTs).
+    All other fields are interned per run into a table of JSON strings (as a UTF-8 blob with offsets),
+    and stored as indices into it (-1 when absent).
+    The GTs of an existing manifest are carried over, so that a folder can be written in multiple runs.
+    '''
+    parallel_safe = False
+    durable = False # Nothing is on disk before close()
+
+    def __init__(self, manifest_file):
+        self.manifest_file = manifest_file
+        self.strings, self.string_ids = [], {}
+        self.names, self.offsets = [], [0]
+        self.points, self.sizes = [], []
+        self.sample_schemas, self.sample_fields = [], {}
+        self.element_schemas, self.element_fields = [], {}
+
+        if os.path.isfile(manifest_file):
+            previous_gts = ColumnarGTReader(manifest_file)
+            for name in previous_gts.keys():
+                self.write(name, previous_gts[name])
+
+    def intern(self, value):
+        string = json.dumps(value, ensure_ascii=False)
+        if string not in self.string_ids:
+            self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return self.string_ids[string]
+
+    @staticmethod
+    def add_fields(columns, num_rows, row):
+        # Every column has one entry per row; missing fields are -1
+        for key, string_id in row.items():
+            if key not in columns:
+                columns[key] = [-1] * num_rows
+        for key, column in columns.items():
+            column.append(row.get(key, -1))
+        return
+
+    def write(self, key, gt):
+        self.names.append(self.intern(key))
+        sample_fields = {k: self.intern(v) for k, v in gt.items() if k != 'data'}
+        self.sample_schemas.append(self.intern(list(gt.keys())))
+        self.add_fields(self.sample_fields, len(self.names)-1, sample_fields)
+
+        for element in gt['data']:
+            self.points.append(element['points'])
+            self.sizes.append((element['width'], element['height']))
+            element_fields = {k: self.intern(v) for k, v in element.items() if k not in ['points', 'width', 'height']}
+            self.element_schemas.append(self.intern(list(element.keys())))
+            self.add_fields(self.element_fields, len(self.element_schemas)-1, element_fields)
+        self.offsets.append(len(self.points))
+        return
+
+    def close(self):
+        strings = [string.encode('utf-8') for string in self.strings]
+        arrays = {
+            'string_data': np.frombuffer(b''.join(strings), dtype=np.uint8),
+            'string_offsets': np.cumsum([0] + [len(string) for string in strings], dtype=np.int64),
+            'names': np.array(self.names, dtype=np.int32),
+            'offsets': np.array(self.offsets, dtype=np.int64),
+            'points': np.array(self.points, dtype=np.float64).reshape(-1, 4, 2),
+            'sizes': np.array(self.sizes, dtype=np.float64).reshape(-1, 2),
+            'sample_schemas': np.array(self.sample_schemas, dtype=np.int32),
+            'element_schemas': np.array(self.element_schemas, dtype=np.int32),
+        }
+        for key, column in self.sample_fields.items():
+            arrays['sample.' + key] = np.array(column, dtype=np.int32)
+        for key, column in self.element_fields.items():
+            arrays['element.' + key] = np.array(column, dtype=np.int32)
+        np.savez(self.manifest_file, **arrays)
+        return
+
+def get_gt_writer(output_folder, gt_format='json'):
+    if gt_format == 'json':
+        return JsonGTWriter(output_folder)
+    elif gt_format == 'jsonl':
+        return JsonlGTWriter(os.path.join(output_folder, JSONL_MANIFEST))
+    elif gt_format == 'npz':
+        return ColumnarGTWriter(os.path.join(output_folder, COLUMNAR_MANIFEST))
+    else:
+        raise NotImplementedError
+
+## ------------------ Readers ------------------ ##
+
+def read_jsonl_gt(manifest_file):
+    '''
+    Read a JSONL manifest into a dict of {sample name: GT}
+    '''
+    gts = {}
+    with open(manifest_file, encoding='utf-8') as f:
+        for line in f:
+            compact = json.loads(line)
+            name = compact.pop('name')
+            gts[name] = expand_gt(compact)
+    return gts
+
+def to_number(value):
+    return int(value) if value.is_integer() else value
+
+class ColumnarGTReader:
+    '''
+    Random access to the GT of the samples stored by ColumnarGTWriter
+    '''
+    def __init__(self, manifest_file):
+        with np.load(manifest_file) as data:
+            arrays = dict(data)
+        string_data, string_offsets = arrays['string_data'].tobytes(), arrays['string_offsets']
+        self.strings = [json.loads(string_data[string_offsets[i]:string_offsets[i+1]].decode('utf-8'))
+                        for i in range(len(string_offsets)-1)]
+        self.offsets, self.points, self.sizes = arrays['offsets'], arrays['points'], arrays['sizes']
+        self.sample_schemas, self.element_schemas = arrays['sample_schemas'], arrays['element_schemas']
+        self.sample_fields = {key[len('sample.'):]: column for key, column in arrays.items() if key.startswith('sample.')}
+        self.element_fields = {key[len('element.'):]: column for key, column in arrays.items() if key.startswith('element.')}
+        self.name2index = {self.strings[string_id]: i for i, string_id in enumerate(arrays['names'])}
+
+    def __len__(self):
+        return len(self.name2index)
+
+    def __contains__(self, name):
+        return name in self.name2index
+
+    def keys(self):
+        return self.name2index.keys()
+
+    def get_element(self, i):
+        element = {}
+        for key in self.strings[self.element_schemas[i]]:
+            if key == 'points':
+                element[key] = [[to_number(v) for v in point] for point in self.points[i].tolist()]
+            elif key in ['width', 'height']:
+                element[key] = to_number(self.sizes[i][int(key == 'height')].item())
+            else:
+                element[key] = self.strings[self.element_fields[key][i]]
+        return element
+
+    def __getitem__(self, name):
+        i = self.name2index[name]
+        gt = {}
+        for key in self.strings[self.sample_schemas[i]]:
+            if key == 'data':
+                gt[key] = [self.get_element(j) for j in range(self.offsets[i], self.offsets[i+1])]
+            else:
+                gt[key] = self.strings[self.sample_fields[key][i]]
+        return gt
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+def read_ground_truths(folder):
+    '''
+    Read the GT manifest in the given folder, if any.
+    Returns a mapping of {sample name: GT}, or None if the GTs are individual files.
+    '''
+    if os.path.isfile(os.path.join(folder, COLUMNAR_MANIFEST)):
+        return ColumnarGTReader(os.path.join(folder, COLUMNAR_MANIFEST))
+    if os.path.isfile(os.path.join(folder, JSONL_MANIFEST)):
+        return read_jsonl_gt(os.path.join(folder, JSONL_MANIFEST))
+    return None
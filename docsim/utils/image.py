@@ -16,8 +16,8 @@ def rgb2gray(rgb):
     if len(rgb.shape) == 2: return rgb
     return np.dot(rgb[...,:3], [0.2989, 0.5870, 0.1140]).astype(np.uint8)
 
-import qrcode
 def get_qr_img(min_v=3, max_v=7, data=None):
+    import qrcode
     version = random.randint(min_v, max_v)
     qr = qrcode.QRCode(version=version, border=0)
     qr.add_data(data)
@@ -25,13 +25,78 @@ def get_qr_img(min_v=3, max_v=7, data=None):
     img = qr.make_image(fill_color="black", back_color="white")
     return img
 
-import barcode
+## ------------------ QR codes ------------------ ##
+
+# Pixels per module in qrcode's PIL render
+QR_BOX_SIZE = 10
+
+def get_qr_matrix(data, version):
+    '''
+    Boolean module matrix of the QR code of the data, without border.
+    The version is raised if the data does not fit in it.
+    '''
+    import qrcode
+    qr = qrcode.QRCode(version=version, border=0)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return np.array(qr.get_matrix(), dtype=bool)
+
+def rasterize_qr(matrix, shape, mode='RGB'):
+    '''
+    Scale the module matrix to an image of the given (width, height) and mode,
+    sampling it like a nearest-neighbour resize of qrcode's render does
+    '''
+    width, height = shape
+    full_size = len(matrix) * QR_BOX_SIZE
+    rows = nearest_indices(full_size, height) // QR_BOX_SIZE
+    columns = nearest_indices(full_size, width) // QR_BOX_SIZE
+    image = Image.fromarray(np.where(matrix[rows[:, None], columns], 0, 255).astype(np.uint8))
+    return image if mode == 'L' else image.convert(mode)
+
+## ------------------ Code128 barcodes ------------------ ##
+
+# Layout (in mm) of python-barcode's ImageWriter at 300 DPI, with a 0.5mm quiet zone & no text
+BARCODE_DPI = 300
+BARCODE_MODULE_WIDTH, BARCODE_QUIET_ZONE = 0.2, 0.5
+BARCODE_MARGIN, BARCODE_HEIGHT = 1, 15
+
+def mm2px(mm):
+    return mm * BARCODE_DPI / 25.4
+
+def nearest_indices(src_size, dst_size):
+    '''
+    Source pixel of each destination pixel, as picked by Pillow's nearest-neighbour resize
+    (which accumulates the source position pixel by pixel)
+    '''
+    scale = src_size / dst_size
+    return np.cumsum(np.concatenate([[scale / 2], np.full(dst_size - 1, scale)])).astype(int)
+
 def get_barcode(data, shape=(235, 27)):
-    bar_class = barcode.get_barcode_class('code128')
-    code128 = bar_class(data, barcode.writer.ImageWriter())
-    code128.save('temp', options={"write_text": False, "quiet_zone": 0.5})
-    with Image.open('temp.png') as img:
-        bar_image = img.copy()
-    os.remove('temp.png')
-    resized_bar = bar_image.resize(shape, resample=Image.NEAREST)
-    return resized_bar
+    '''
+    Render the Code128 barcode of the data as an RGB image of the given (width, height).
+    The modules are rasterized in memory, the same way as resizing the ImageWriter's render would.
+    '''
+    import barcode
+    modules = barcode.get_barcode_class('code128')(data).build()[0]
+    bars = np.frombuffer(modules.encode(), dtype=np.uint8) == ord('1')
+
+    # Runs of same-colored modules, with their x positions summed up run by run like the writer does
+    edges = np.flatnonzero(np.diff(bars, prepend=not bars[0], append=not bars[-1]))
+    xpos = np.cumsum(np.concatenate([[BARCODE_QUIET_ZONE], np.diff(edges) * BARCODE_MODULE_WIDTH]))
+    is_bar = bars[edges[:-1]]
+    x_start = mm2px(xpos[:-1][is_bar]).astype(int)
+    x_end = (mm2px(xpos[1:][is_bar]) - 1).astype(int)
+
+    # Columns & rows of the full-size render which are covered by the bars
+    full_width = int(mm2px(2 * BARCODE_QUIET_ZONE + len(bars) * BARCODE_MODULE_WIDTH))
+    full_height = int(mm2px(2 * BARCODE_MARGIN + BARCODE_HEIGHT))
+    coverage = np.zeros(full_width + 1, dtype=np.int32)
+    np.add.at(coverage, x_start, 1)
+    np.add.at(coverage, x_end + 1, -1)
+    bar_columns = np.cumsum(coverage[:-1]) > 0
+    bar_rows = np.zeros(full_height, dtype=bool)
+    bar_rows[int(mm2px(BARCODE_MARGIN)):int(mm2px(BARCODE_MARGIN + BARCODE_HEIGHT)) + 1] = True
+
+    width, height = shape
+    is_black = bar_rows[nearest_indices(full_height, height), None] & bar_columns[nearest_indices(full_width, width)]
+    return Image.fromarray(np.where(is_black, 0, 255).astype(np.uint8)).convert('RGB')
@@ -0,0 +1,95 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+from docsim.utils.cache import CACHE_DIR, save_to_cache
+
+# Bump when the way images are decoded & resized changes, to invalidate the pools cached on disk
+IMAGE_POOL_VERSION = 1
+
+# Modes an image can be stored as a plain uint8 array in (others are stored as RGB)
+ARRAY_MODES = ['L', 'RGB', 'RGBA']
+
+class ImagePool:
+    '''
+    Images decoded & resized once to a fixed (width, height), in one contiguous uint8 array of N x H x W x C.
+    Each image is resized in its own mode, then converted to the pool's mode,
+    the same as pasting it on a background of that mode would.
+
+    If all the images fit in the memory budget, they are preloaded. The array is then also saved as a .npy
+    in the cache folder (keyed by the files, their modification times, the size & mode) and memory-mapped,
+    so that the worker processes of a run share its pages, and later runs skip decoding.
+    Otherwise, the pool holds as many images as the budget allows, evicting the least recently used.
+    '''
+    def __init__(self, image_files, size, mode='RGB', memory_budget=256*1024**2, cache_folder=None):
+        self.image_files = image_files
+        self.size = size
+        self.mode = mode if mode in ARRAY_MODES else 'RGB'
+        self.cache_folder = cache_folder if cache_folder is not None else os.path.join(CACHE_DIR, 'image-pools')
+
+        width, height = size
+        num_channels = len(self.mode)
+        self.image_shape = (height, width, num_channels) if num_channels > 1 else (height, width)
+        self.capacity = max(1, min(len(image_files), memory_budget // int(np.prod(self.image_shape))))
+
+        if self.capacity == len(image_files):
+            self.array = self.load_all()
+            self.slots = None
+        else:
+            self.array = np.zeros((self.capacity,) + self.image_shape, dtype=np.uint8)
+            self.slots = OrderedDict() # Index of the image -> its slot in the array, least recently used first
+
+    def __len__(self):
+        return len(self.image_files)
+
+    def load_image(self, image_file):
+        with Image.open(image_file) as image:
+            image = image.resize(self.size)
+        return np.asarray(image.convert(self.mode))
+
+    def get_cache_file(self):
+        files = [(os.path.abspath(f), os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in self.image_files]
+        key = json.dumps([IMAGE_POOL_VERSION, self.size, self.mode, files])
+        return os.path.join(self.cache_folder, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.npy')
+
+    def load_all(self):
+        cache_file = self.get_cache_file()
+        try:
+            return np.load(cache_file, mmap_mode='r')
+        except (OSError, ValueError):
+            pass
+
+        array = np.empty((len(self.image_files),) + self.image_shape, dtype=np.uint8)
+        for i, image_file in enumerate(self.image_files):
+            array[i] = self.load_image(image_file)
+
+        if not save_to_cache(cache_file, lambda f: np.save(f, array)):
+            return array
+        try:
+            return np.load(cache_file, mmap_mode='r')
+        except (OSError, ValueError):
+            return array
+
+    def __getitem__(self, index):
+        '''
+        The image at the given index, as an array
+        '''
+        if self.slots is None:
+            return self.array[index]
+
+        if index in self.slots:
+            self.slots.move_to_end(index)
+            return self.array[self.slots[index]]
+
+        if len(self.slots) < self.capacity:
+            slot = len(self.slots)
+        else:
+            slot = self.slots.popitem(last=False)[1]
+        self.array[slot] = self.load_image(self.image_files[index])
+        self.slots[index] = slot
+        return self.array[slot]
+
+    def get_image(self, index):
+        return Image.fromarray(self[index])
@@ -1,6 +1,9 @@
+import os
+import json
 import unicodedata as ud
 import random
 import string
+from docsim.utils.cache import CACHE_DIR, save_to_cache
 
 # ISO Language code to script name
 ISO639_TO_SCRIPT = {
@@ -20,7 +23,7 @@ ISO639_TO_SCRIPT = {
 
 MAX_RANGE = 1114112
 ALLOWED_CATEGORIES = ['L', 'M', 'N', 'P']
-def get_characters(script_name, only_prefix_match=False, skip_punctuations=False, skip_numbers=False, verbose=True):
+def scan_characters(script_name, only_prefix_match=False, skip_punctuations=False, skip_numbers=False, verbose=True):
     characters = {}
     script_name = script_name.upper()
     for i in range(MAX_RANGE):
@@ -49,6 +52,45 @@ def get_characters(script_name, only_prefix_match=False, skip_punctuations=False
         
     return characters
 
+## ------------------ Script tables cache ------------------ ##
+
+# Bump when the scan above changes, to invalidate the tables cached on disk
+SCRIPT_TABLE_VERSION = 1
+
+script_tables = {} # Shared by all the LanguageCharacters of the process
+
+def get_script_table_file(key):
+    script_name, only_prefix_match, skip_punctuations, skip_numbers = key
+    table_folder = os.path.join(CACHE_DIR, 'scripts-v%d-unicode-%s' % (SCRIPT_TABLE_VERSION, ud.unidata_version))
+    return os.path.join(table_folder, '%s-%d%d%d.json' % (script_name, only_prefix_match, skip_punctuations, skip_numbers))
+
+def load_script_table(table_file):
+    try:
+        with open(table_file, encoding='utf-8') as f:
+            return {c: tuple(details) for c, details in json.load(f).items()}
+    except (OSError, ValueError):
+        return None
+
+def save_script_table(table_file, characters):
+    save_to_cache(table_file, lambda f: f.write(json.dumps(characters, ensure_ascii=False).encode('utf-8')))
+    return
+
+def get_characters(script_name, only_prefix_match=False, skip_punctuations=False, skip_numbers=False, verbose=True):
+    '''
+    Characters of the given script, as a dict of {character: (Unicode name, category)}.
+    Scanning the whole Unicode range is slow, so each table is computed once per Unicode version,
+    and then loaded from the on-disk cache (at most once per process).
+    '''
+    key = (script_name.upper(), only_prefix_match, skip_punctuations, skip_numbers)
+    if key not in script_tables:
+        table_file = get_script_table_file(key)
+        characters = load_script_table(table_file)
+        if characters is None:
+            characters = scan_characters(script_name, only_prefix_match, skip_punctuations, skip_numbers, verbose)
+            save_script_table(table_file, characters)
+        script_tables[key] = characters
+    return script_tables[key]
+
 def get_vowels(characters):
     vowels = []
     for c, (name, category) in characters.items():
@@ -1,6 +1,7 @@
 from uuid import uuid4
 import random
 import string
+import numpy as np
 
 def random_id():
     return uuid4().hex
@@ -9,3 +10,18 @@ def random_string(min_l=10, max_l=20):
     length = random.randint(min_l, max_l)
     return ''.join(random.choice(string.ascii_lowercase +string.ascii_uppercase + string.digits)
                          for i in range(length))
+
+def derive_seed(*keys):
+    '''
+    Derive an independent 64-bit seed from a sequence of integers, like (run seed, sample index)
+    '''
+    return int(np.random.SeedSequence(list(keys)).generate_state(1, np.uint64)[0])
+
+def get_worker_seed(entropy):
+    '''
+    Seed of the current worker process of a multiprocessing pool: every worker draws from its own
+    independent RNG stream, spawned from the entropy given to the whole pool (by the worker's identity)
+    '''
+    import multiprocessing
+    worker_id = multiprocessing.current_process()._identity
+    return int(np.random.SeedSequence(entropy, spawn_key=worker_id).generate_state(1, np.uint64)[0])
@@ -0,0 +1,217 @@
+'''
+Random strings matching a regex, like rstr.xeger(), but with the regex parsed & compiled once
+into a tree of nodes, whose character classes and repeat bounds are precomputed.
+Strings are sampled one at a time (with Python's random module), or a batch at once (with a NumPy Generator).
+'''
+import random
+import string
+import numpy as np
+
+try:
+    import re._parser as sre_parse
+except ImportError: # Python < 3.11
+    import sre_parse
+
+# Upper bound of the number of repeats for * and +
+STAR_PLUS_LIMIT = 100
+
+# Characters of the classes, as in rstr
+PRINTABLE = string.printable
+CATEGORIES = {
+    'category_digit': string.digits,
+    'category_not_digit': string.ascii_letters + string.punctuation,
+    'category_space': string.whitespace,
+    'category_not_space': string.printable.strip(),
+    'category_word': string.ascii_letters + string.digits + '_',
+    'category_not_word': ''.join(sorted(set(string.printable).difference(string.ascii_letters + string.digits + '_'))),
+}
+
+## ------------------ Nodes ------------------ ##
+
+# Every node samples a string with sample(rand, groups), where `rand` is a random.Random (or the random module)
+# and `groups` maps group numbers to their sampled string. For a batch, sample_batch(rows, rng, groups) returns
+# an object array with the strings of the given rows of the batch, and `groups` maps to an array for all the rows.
+
+class Literal:
+    def __init__(self, text):
+        self.text = text
+
+    def sample(self, rand, groups):
+        return self.text
+
+    def sample_batch(self, rows, rng, groups):
+        return np.full(len(rows), self.text, dtype=object)
+
+class CharacterSet:
+    def __init__(self, characters):
+        self.characters = list(characters)
+        self.character_array = np.array(self.characters, dtype=object)
+
+    def sample(self, rand, groups):
+        return rand.choice(self.characters)
+
+    def sample_batch(self, rows, rng, groups):
+        return self.character_array[rng.integers(len(self.characters), size=len(rows))]
+
+class Sequence:
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def sample(self, rand, groups):
+        return ''.join(node.sample(rand, groups) for node in self.nodes)
+
+    def sample_batch(self, rows, rng, groups):
+        result = np.full(len(rows), '', dtype=object)
+        for node in self.nodes:
+            result += node.sample_batch(rows, rng, groups)
+        return result
+
+class Branch:
+    def __init__(self, alternatives):
+        self.alternatives = alternatives
+
+    def sample(self, rand, groups):
+        return rand.choice(self.alternatives).sample(rand, groups)
+
+    def sample_batch(self, rows, rng, groups):
+        result = np.empty(len(rows), dtype=object)
+        choices = rng.integers(len(self.alternatives), size=len(rows))
+        for i, alternative in enumerate(self.alternatives):
+            selected = choices == i
+            if selected.any():
+                result[selected] = alternative.sample_batch(rows[selected], rng, groups)
+        return result
+
+class Repeat:
+    def __init__(self, min_count, max_count, body):
+        self.min_count = min_count
+        self.max_count = min(max_count, STAR_PLUS_LIMIT)
+        self.body = body
+
+    def sample(self, rand, groups):
+        count = rand.randint(self.min_count, self.max_count)
+        return ''.join(self.body.sample(rand, groups) for i in range(count))
+
+    def sample_batch(self, rows, rng, groups):
+        result = np.full(len(rows), '', dtype=object)
+        if self.min_count == self.max_count:
+            counts = np.full(len(rows), self.min_count)
+        else:
+            counts = rng.integers(self.min_count, self.max_count + 1, size=len(rows))
+        # Rows which repeat at least i+1 times get their (i+1)-th repetition
+        for i in range(counts.max(initial=0)):
+            selected = counts > i
+            result[selected] += self.body.sample_batch(rows[selected], rng, groups)
+        return result
+
+class Group:
+    def __init__(self, number, body):
+        self.number = number
+        self.body = body
+
+    def sample(self, rand, groups):
+        text = self.body.sample(rand, groups)
+        if self.number:
+            groups[self.number] = text
+        return text
+
+    def sample_batch(self, rows, rng, groups):
+        texts = self.body.sample_batch(rows, rng, groups)
+        if self.number:
+            groups[self.number][rows] = texts
+        return texts
+
+class GroupReference:
+    def __init__(self, number):
+        self.number = number
+
+    def sample(self, rand, groups):
+        return groups.get(self.number, '')
+
+    def sample_batch(self, rows, rng, groups):
+        return groups[self.number][rows]
+
+## ------------------ Compilation ------------------ ##
+
+def get_class_characters(items):
+    '''
+    Characters matched by the items of a [...] class, in order
+    '''
+    characters, negate = [], False
+    for opcode, value in items:
+        opcode = opcode.name.lower()
+        if opcode == 'negate':
+            negate = True
+        elif opcode == 'literal':
+            characters.append(chr(value))
+        elif opcode == 'range':
+            characters.extend(chr(i) for i in range(value[0], value[1] + 1))
+        elif opcode == 'category':
+            characters.extend(CATEGORIES[value.name.lower()])
+        else:
+            raise NotImplementedError('Unsupported regex class item: ' + opcode)
+    if negate:
+        return sorted(set(PRINTABLE).difference(characters))
+    return characters
+
+def compile_node(opcode, value):
+    opcode = opcode.name.lower()
+    if opcode == 'literal':
+        return Literal(chr(value))
+    elif opcode == 'not_literal':
+        return CharacterSet(PRINTABLE.replace(chr(value), ''))
+    elif opcode in ['at', 'assert_not']:
+        return Literal('')
+    elif opcode == 'in':
+        return CharacterSet(get_class_characters(value))
+    elif opcode == 'any':
+        return CharacterSet(PRINTABLE.replace('\n', ''))
+    elif opcode == 'category':
+        return CharacterSet(CATEGORIES[value.name.lower()])
+    elif opcode == 'branch':
+        return Branch([compile_sequence(alternative) for alternative in value[1]])
+    elif opcode == 'subpattern':
+        return Group(value[0], compile_sequence(value[-1]))
+    elif opcode == 'assert':
+        return compile_sequence(value[1])
+    elif opcode == 'groupref':
+        return GroupReference(value)
+    elif opcode in ['min_repeat', 'max_repeat']:
+        min_count, max_count, body = value
+        return Repeat(min_count, max_count, compile_sequence(body))
+    else:
+        raise NotImplementedError('Unsupported regex element: ' + opcode)
+
+def compile_sequence(parsed):
+    nodes = []
+    for opcode, value in parsed:
+        node = compile_node(opcode, value)
+        # Merge consecutive literals
+        if isinstance(node, Literal) and nodes and isinstance(nodes[-1], Literal):
+            nodes[-1] = Literal(nodes[-1].text + node.text)
+        else:
+            nodes.append(node)
+    if not nodes:
+        return Literal('')
+    return nodes[0] if len(nodes) == 1 else Sequence(nodes)
+
+class RegexSampler:
+    '''
+    Samples random strings matching the given regex, compiled once
+    '''
+    def __init__(self, pattern):
+        self.pattern = pattern
+        parsed = sre_parse.parse(pattern)
+        self.root = compile_sequence(parsed)
+        state = parsed.state if hasattr(parsed, 'state') else parsed.pattern # Python < 3.8
+        self.group_numbers = list(range(1, state.groups))
+
+    def sample(self, rand=random):
+        return self.root.sample(rand, {})
+
+    def sample_batch(self, count, rng):
+        '''
+        Sample a list of `count` strings, using the given NumPy Generator
+        '''
+        groups = {number: np.full(count, '', dtype=object) for number in self.group_numbers}
+        return list(self.root.sample_batch(np.arange(count), rng, groups))
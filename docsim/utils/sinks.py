@@ -0,0 +1,297 @@
+import os
+import io
+import json
+import time
+import tarfile
+import queue
+import threading
+from PIL import Image
+from docsim.utils.ground_truth import get_gt_writer
+
+## ------------------ Encoding ------------------ ##
+
+def encode_image(image, image_ext='jpg'):
+    '''
+    Encode a PIL image or a numpy array to the bytes of the given file format
+    '''
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(image)
+    buffer = io.BytesIO()
+    image.save(buffer, format=Image.registered_extensions()['.' + image_ext])
+    return buffer.getvalue()
+
+def encode_gt(gt):
+    return json.dumps(gt, ensure_ascii=False, indent=4).encode('utf-8')
+
+def encode_sample(image, gt, image_ext='jpg'):
+    '''
+    Encode the image of a sample, into a record of {file extension: file bytes, 'gt': GT}.
+    The GT is serialized by the sink, based on its GT format.
+    '''
+    return {image_ext: encode_image(image, image_ext), 'gt': gt}
+
+## ------------------ Sinks ------------------ ##
+
+class FolderSink:
+    '''
+    Writes each sample's image as <key>.jpg in a flat folder, with its GT
+    as <key>.json (gt_format='json') or into a single manifest for the folder ('jsonl' or 'npz').
+    '''
+    def __init__(self, output_folder, gt_format='json'):
+        self.output_folder = output_folder
+        os.makedirs(output_folder, exist_ok=True)
+        self.gt_writer = get_gt_writer(output_folder, gt_format)
+        
+        # Whether multiple processes can write into the same folder independently
+        self.parallel_safe = self.gt_writer.parallel_safe
+        
+        # Called with the keys of the samples once they are safely on disk
+        self.on_commit = None
+        self.uncommitted = []
+
+    def __getstate__(self):
+        # The commit hook belongs to the process running the generation
+        return dict(self.__dict__, on_commit=None)
+
+    def commit(self, key):
+        if self.gt_writer.durable:
+            self.on_commit and self.on_commit([key])
+        else:
+            self.uncommitted.append(key)
+        return
+
+    def get_output_path(self, key):
+        '''
+        Path of the sample with the given key (without the extensions of its files)
+        '''
+        return os.path.join(self.output_folder, key)
+
+    def write(self, key, image, gt, image_ext='jpg'):
+        output_file = self.get_output_path(key)
+        if isinstance(image, Image.Image):
+            image.save(output_file + '.' + image_ext)
+        else:
+            from imageio import imsave
+            imsave(output_file + '.' + image_ext, image)
+        self.gt_writer.write(key, gt)
+        self.commit(key)
+        return output_file
+
+    def write_record(self, key, record):
+        output_file = self.get_output_path(key)
+        for ext, data in record.items():
+            if ext == 'gt':
+                self.gt_writer.write(key, data)
+                continue
+            with open(output_file + '.' + ext, 'wb') as f:
+                f.write(data)
+        self.commit(key)
+        return output_file
+
+    def close(self):
+        self.gt_writer.close()
+        self.on_commit and self.on_commit(self.uncommitted)
+        self.uncommitted = []
+        return
+
+class TarShardSink:
+    '''
+    Streams samples into size-bounded tar shards in WebDataset layout,
+    i.e. the files of a sample (<key>.jpg, <key>.json) are stored next to each other.
+    An index of all the shards is maintained in `shards.json`.
+    A shard is written as `<name>.tmp` and only moved to its name once closed, so a crash never leaves
+    a truncated shard among the complete ones. Samples count as written (on_commit) once their shard is closed and indexed.
+    '''
+    INDEX_FILE = 'shards.json'
+
+    # A tar stream has a single writer, so only the owning process can write to it
+    parallel_safe = False
+
+    def __init__(self, output_folder, shard_prefix='shard', max_shard_size=1024**3, max_shard_samples=10000):
+        self.output_folder = output_folder
+        self.shard_prefix = shard_prefix
+        self.max_shard_size = max_shard_size
+        self.max_shard_samples = max_shard_samples
+        os.makedirs(output_folder, exist_ok=True)
+
+        # Continue the index of any previous run into the same folder
+        self.index_file = os.path.join(output_folder, TarShardSink.INDEX_FILE)
+        if os.path.isfile(self.index_file):
+            with open(self.index_file, encoding='utf-8') as f:
+                self.index = json.load(f)
+        else:
+            self.index = {'__kind__': 'wids-shard-index-v1', 'wids_version': 1, 'shardlist': []}
+
+        self.tar, self.shard = None, None
+        self.on_commit, self.shard_keys = None, []
+
+    def open_shard(self):
+        shard_id = len(self.index['shardlist'])
+        shard_name = '%s-%06d.tar' % (self.shard_prefix, shard_id)
+        while os.path.exists(os.path.join(self.output_folder, shard_name)):
+            shard_id += 1
+            shard_name = '%s-%06d.tar' % (self.shard_prefix, shard_id)
+
+        # A .tmp left by a crashed run only holds samples which were never committed, so it's overwritten
+        self.tar = tarfile.open(os.path.join(self.output_folder, shard_name + '.tmp'), 'w')
+        self.shard = {'url': shard_name, 'nsamples': 0, 'filesize': 0}
+        return
+
+    def close_shard(self):
+        if not self.tar:
+            return
+        self.tar.close()
+        shard_file = os.path.join(self.output_folder, self.shard['url'])
+        os.replace(shard_file + '.tmp', shard_file)
+        self.shard['filesize'] = os.path.getsize(shard_file)
+        self.index['shardlist'].append(self.shard)
+        self.write_index()
+        self.on_commit and self.on_commit(self.shard_keys)
+        self.tar, self.shard, self.shard_keys = None, None, []
+        return
+
+    def write_index(self):
+        with open(self.index_file, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=4)
+        return
+
+    def write(self, key, image, gt, image_ext='jpg'):
+        return self.write_record(key, encode_sample(image, gt, image_ext))
+
+    def write_record(self, key, record):
+        record = {ext: encode_gt(data) if ext == 'gt' else data for ext, data in record.items()}
+        record_size = sum(len(data) for data in record.values())
+        if self.tar and (self.shard['nsamples'] >= self.max_shard_samples or
+                         self.tar.offset + record_size > self.max_shard_size):
+            self.close_shard()
+        if not self.tar:
+            self.open_shard()
+
+        for ext, data in record.items():
+            member = tarfile.TarInfo('%s.%s' % (key, 'json' if ext == 'gt' else ext))
+            member.size, member.mtime, member.mode = len(data), time.time(), 0o644
+            self.tar.addfile(member, io.BytesIO(data))
+        self.shard['nsamples'] += 1
+        self.shard_keys.append(key)
+
+        return os.path.join(self.output_folder, self.shard['url']) + '#' + key
+
+    def close(self):
+        self.close_shard()
+        return
+
+class PipelinedSink:
+    '''
+    Hands the samples over a bounded queue to a pool of threads, which encode and write
+    them to the wrapped sink. The producer blocks while the queue is full (backpressure).
+    Since Pillow releases the GIL while encoding, this overlaps the encoding & I/O with rendering.
+    '''
+    # The threads belong to this process
+    parallel_safe = False
+
+    def __init__(self, sink, num_threads=2, max_queue_size=16):
+        self.sink = sink
+        self.queue = queue.Queue(max_queue_size)
+        self.lock = threading.Lock() # For sinks with a single writer
+        self.max_depth, self.error = 0, None
+
+        self.threads = [threading.Thread(target=self.run_writer, daemon=True) for i in range(num_threads)]
+        for thread in self.threads:
+            thread.start()
+
+    @property
+    def depth(self):
+        '''
+        Number of samples waiting to be written
+        '''
+        return self.queue.qsize()
+
+    def run_writer(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            try:
+                key, image, gt, image_ext, record = item
+                if record is None and self.sink.parallel_safe:
+                    # Writes are independent, so no need to serialize them
+                    self.sink.write(key, image, gt, image_ext)
+                else:
+                    if record is None:
+                        record = encode_sample(image, gt, image_ext)
+                    with self.lock:
+                        self.sink.write_record(key, record)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def put(self, item):
+        if self.error:
+            raise self.error
+        self.queue.put(item)
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return
+
+    def get_output_path(self, key):
+        '''
+        Path the wrapped sink will write the sample to, if known before it's written (like for a FolderSink),
+        else its key (like for tar shards, where it depends on the shard the sample lands in)
+        '''
+        if hasattr(self.sink, 'get_output_path'):
+            return self.sink.get_output_path(key)
+        return key
+
+    def write(self, key, image, gt, image_ext='jpg'):
+        '''
+        Queue the sample for writing. Returns its output path (see get_output_path())
+        '''
+        self.put((key, image, gt, image_ext, None))
+        return self.get_output_path(key)
+
+    def write_record(self, key, record):
+        self.put((key, None, None, None, record))
+        return self.get_output_path(key)
+
+    def close(self):
+        for thread in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.sink.close()
+        if self.error:
+            raise self.error
+        return
+
+def add_output_arguments(parser):
+    '''
+    Add the command line options of the output format (those of get_sink()) to an argparse parser
+    '''
+    parser.add_argument('--output_format', choices=['files', 'tar'], default='files',
+                        help='Write an image+json pair per sample, or stream samples into tar shards')
+    parser.add_argument('--shard_size_mb', type=int, default=1024, help='Maximum size of a tar shard')
+    parser.add_argument('--shard_samples', type=int, default=10000, help='Maximum samples in a tar shard')
+    parser.add_argument('--gt_format', choices=['json', 'jsonl', 'npz'], default='json',
+                        help='Ground truth as a JSON per sample, or as a single compact JSONL/columnar NumPy manifest '
+                             '(only with --output_format files: tar shards embed the JSON of each sample)')
+    return
+
+def get_sink_from_args(output_folder, args):
+    '''
+    Create the sink for the output options parsed from the command line (see add_output_arguments())
+    '''
+    return get_sink(output_folder, args.output_format, args.shard_size_mb, args.shard_samples, args.gt_format)
+
+def get_sink(output_folder, output_format='files', shard_size_mb=1024, shard_samples=10000, gt_format='json'):
+    '''
+    Create the sink for the given output format
+    '''
+    if output_format == 'files':
+        return FolderSink(output_folder, gt_format)
+    elif output_format == 'tar':
+        if gt_format != 'json':
+            exit('GT format %s is not supported with tar shards, which embed the JSON GT of each sample' % gt_format)
+        return TarShardSink(output_folder, max_shard_size=shard_size_mb*1024*1024, max_shard_samples=shard_samples)
+    else:
+        raise NotImplementedError
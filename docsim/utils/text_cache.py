@@ -0,0 +1,101 @@
+import math
+from collections import OrderedDict
+from PIL import Image, ImageDraw
+from docsim.utils.fonts import get_font_metrics
+
+class TextBitmap:
+    '''
+    A rasterized text: its glyph mask, where to place the mask relative
+    to the text's location, and the measured size of the text.
+    '''
+    def __init__(self, mask, offset, size):
+        self.mask = mask
+        self.offset = offset
+        self.size = size
+
+class TextBitmapCache:
+    '''
+    Cache of rendered text bitmaps, keyed by (font path, size, color, text, align, spacing).
+    Texts from closed option sets are pinned upfront and never evicted,
+    everything else is kept in a bounded LRU.
+    '''
+    def __init__(self, max_size=2048):
+        self.max_size = max_size
+        self.pinned = {}
+        self.lru = OrderedDict()
+        self.hits, self.misses = 0, 0
+
+        # Scratch canvas, only used for measuring and rasterizing
+        self.scratch_draw = ImageDraw.Draw(Image.new('L', (1, 1)))
+
+    @staticmethod
+    def get_key(text, font, color, align, spacing):
+        return (font.path, font.size, color, text, align, spacing)
+
+    def rasterize(self, text, font, align, spacing):
+        '''
+        Render the text into a standalone mask, exactly as ImageDraw.text would on a canvas
+        '''
+        metrics = get_font_metrics(font)
+        size = metrics.get_size(text, spacing)
+        if '\n' in text:
+            left, top, right, bottom = self.scratch_draw.multiline_textbbox((0, 0), text, font=font, align=align, spacing=spacing)
+        else:
+            left, top, right, bottom = metrics.get_bbox(text)
+        if right <= left or bottom <= top:
+            # Nothing to draw (like whitespace), only the measurements matter
+            return TextBitmap(None, (0, 0), size)
+
+        # Centered & right-aligned lines of multiline text can start at fractional offsets:
+        # the mask is widened to whole pixels, and moved by whole pixels only, to render them the same
+        left, top, right, bottom = math.floor(left), math.floor(top), math.ceil(right), math.ceil(bottom)
+        mask = Image.new('L', (right-left, bottom-top))
+        ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font, align=align, spacing=spacing)
+        return TextBitmap(mask, (left, top), size)
+
+    def pin(self, text, font, color, align='left', spacing=4):
+        '''
+        Pre-render a text which is known to repeat (like from fixed options)
+        '''
+        key = self.get_key(text, font, color, align, spacing)
+        if key not in self.pinned:
+            self.pinned[key] = self.lru.pop(key, None) or self.rasterize(text, font, align, spacing)
+        return
+
+    def get(self, text, font, color, align='left', spacing=4):
+        key = self.get_key(text, font, color, align, spacing)
+        if key in self.pinned:
+            self.hits += 1
+            return self.pinned[key]
+
+        if key in self.lru:
+            self.hits += 1
+            self.lru.move_to_end(key)
+            return self.lru[key]
+
+        self.misses += 1
+        bitmap = self.rasterize(text, font, align, spacing)
+        self.lru[key] = bitmap
+        if len(self.lru) > self.max_size:
+            self.lru.popitem(last=False)
+        return bitmap
+
+    def draw(self, img_draw, xy, text, font, color, align='left', spacing=4):
+        '''
+        Paste the (cached) text bitmap on the canvas and return the text size
+        '''
+        bitmap = self.get(text, font, color, align, spacing)
+        if bitmap.mask is not None:
+            img_draw.bitmap((xy[0]+bitmap.offset[0], xy[1]+bitmap.offset[1]), bitmap.mask, fill=color)
+        return bitmap.size
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'pinned': len(self.pinned), 'cached': len(self.lru)}
+
+    @staticmethod
+    def summary(stats):
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = 100.0 * stats['hits'] / lookups if lookups else 0.0
+        return 'Text cache hit rate: %.1f%% (%d/%d lookups, %d pinned, %d cached)' % (
+            hit_rate, stats['hits'], lookups, stats['pinned'], stats['cached'])
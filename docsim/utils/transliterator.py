@@ -1,7 +1,12 @@
+from collections import OrderedDict
 from docsim.utils.lang import ISO639_TO_SCRIPT
 
 class Transliterator:
-    def __init__(self, src_lang, dest_lang):
+    '''
+    Transliterates phrases from the source to the destination language, with the best backend for the pair.
+    Results are memoized in a bounded LRU, and batches are transliterated with a single backend call.
+    '''
+    def __init__(self, src_lang, dest_lang, cache_size=4096):
         if src_lang in AksharaMukhaTransliterator.LANG2SCRIPT and dest_lang in AksharaMukhaTransliterator.LANG2SCRIPT:
             self.transliterator = AksharaMukhaTransliterator(src_lang, dest_lang)
         elif src_lang in IndicTransliterator.LANG2SCHEME and dest_lang in IndicTransliterator.LANG2SCHEME:
@@ -11,8 +16,32 @@ class Transliterator:
         else:
             raise NotImplementedError
         
-        self.transliterate = self.transliterator.transliterate
         self.reverse_transliterate = self.transliterator.reverse_transliterate
+        self.cache, self.cache_size = OrderedDict(), cache_size
+    
+    def remember(self, phrase, result):
+        self.cache[phrase] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return
+    
+    def transliterate(self, phrase):
+        if phrase in self.cache:
+            self.cache.move_to_end(phrase)
+            return self.cache[phrase]
+        result = self.transliterator.transliterate(phrase)
+        self.remember(phrase, result)
+        return result
+    
+    def transliterate_batch(self, phrases):
+        '''
+        Transliterate a list of phrases, those not in the cache all at once
+        '''
+        missing = [phrase for phrase in dict.fromkeys(phrases) if phrase not in self.cache]
+        results = dict(zip(missing, self.transliterator.transliterate_batch(missing))) if missing else {}
+        for phrase, result in results.items():
+            self.remember(phrase, result)
+        return [results[phrase] if phrase in results else self.transliterate(phrase) for phrase in phrases]
 
 
 from abc import ABC, abstractmethod
@@ -28,6 +57,24 @@ class TransliteratorBase(ABC):
     @abstractmethod
     def reverse_transliterate(self, phrase):
         pass
+    
+    def transliterate_batch(self, phrases):
+        return [self.transliterate(phrase) for phrase in phrases]
+    
+    # Phrases (like multiline names & addresses) don't have blank lines, so a batch can be joined by them
+    BATCH_SEPARATOR = '\n\n'
+    
+    def transliterate_joined(self, phrases):
+        '''
+        Transliterate a batch in a single call, for backends with a high overhead per call
+        '''
+        if any(self.BATCH_SEPARATOR in phrase for phrase in phrases):
+            return TransliteratorBase.transliterate_batch(self, phrases)
+        results = self.transliterate(self.BATCH_SEPARATOR.join(phrases)).split(self.BATCH_SEPARATOR)
+        if len(results) != len(phrases):
+            # The separator didn't survive, so go one by one
+            return TransliteratorBase.transliterate_batch(self, phrases)
+        return results
 
 ## ---------- TRANSLITERATOR PACKAGES ---------- ##
 
@@ -47,47 +94,50 @@ class EuropeanTransliterator(TransliteratorBase):
         return euro_transliterate.translit(en_phrase, self.src_lang)
 
 
-from indic_transliteration import sanscript
-from indic_transliteration.sanscript import transliterate as indic_transliterate
 class IndicTransliterator(TransliteratorBase):
+    # Names of the sanscript schemes, which is only imported when used
     LANG2SCHEME = {
-        'en': sanscript.HK, # sanscript.ITRANS
-        'ta': sanscript.TAMIL,
-        'te': sanscript.TELUGU,
-        'ml': sanscript.MALAYALAM,
-        'kn': sanscript.KANNADA,
-        'or': sanscript.ORIYA,
-        'bn': sanscript.BENGALI,
-        'as': sanscript.BENGALI, # Assamese uses bn script
-        'gu': sanscript.GUJARATI,
-        'pa': sanscript.GURMUKHI, # Punjabi / Panjabi
-        'hi': sanscript.DEVANAGARI, # Hindi
-        'mr': sanscript.DEVANAGARI, # Marathi
-        'ne': sanscript.DEVANAGARI, # Nepali
-        'new': sanscript.DEVANAGARI, # Newari - NepalBhasa
-        'raj': sanscript.DEVANAGARI, # Rajasthani
+        'en': 'HK', # 'ITRANS'
+        'ta': 'TAMIL',
+        'te': 'TELUGU',
+        'ml': 'MALAYALAM',
+        'kn': 'KANNADA',
+        'or': 'ORIYA',
+        'bn': 'BENGALI',
+        'as': 'BENGALI', # Assamese uses bn script
+        'gu': 'GUJARATI',
+        'pa': 'GURMUKHI', # Punjabi / Panjabi
+        'hi': 'DEVANAGARI', # Hindi
+        'mr': 'DEVANAGARI', # Marathi
+        'ne': 'DEVANAGARI', # Nepali
+        'new': 'DEVANAGARI', # Newari - NepalBhasa
+        'raj': 'DEVANAGARI', # Rajasthani
         # Minorities
-        'ks': sanscript.DEVANAGARI, # Current Kashmiri is moving towards Urdu script
-        'gom': sanscript.DEVANAGARI, # Konkani (Goan)
-        'mai': sanscript.DEVANAGARI, # Maithili
-        'sat': sanscript.DEVANAGARI, # Santali
-        'gon': sanscript.GUNJALA_GONDI,
+        'ks': 'DEVANAGARI', # Current Kashmiri is moving towards Urdu script
+        'gom': 'DEVANAGARI', # Konkani (Goan)
+        'mai': 'DEVANAGARI', # Maithili
+        'sat': 'DEVANAGARI', # Santali
+        'gon': 'GUNJALA_GONDI',
     }
     
     def __init__(self, src_lang, dest_lang):
+        from indic_transliteration import sanscript
         self.src_lang = src_lang
         self.dest_lang = dest_lang
         
-        self.src_script = IndicTransliterator.LANG2SCHEME[src_lang]
-        self.dest_script = IndicTransliterator.LANG2SCHEME[dest_lang]
+        self.src_script = getattr(sanscript, IndicTransliterator.LANG2SCHEME[src_lang])
+        self.dest_script = getattr(sanscript, IndicTransliterator.LANG2SCHEME[dest_lang])
+        self.indic_transliterate = sanscript.transliterate
     
     def transliterate(self, phrase):
-        return indic_transliterate(phrase, self.src_script, self.dest_script)
+        return self.indic_transliterate(phrase, self.src_script, self.dest_script)
     
     def reverse_transliterate(self, phrase):
-        return indic_transliterate(phrase, self.dest_script, self.src_script)
+        return self.indic_transliterate(phrase, self.dest_script, self.src_script)
+    
+    def transliterate_batch(self, phrases):
+        return self.transliterate_joined(phrases)
 
-from aksharamukha.transliterate import process as aksharamukha_xlit
 class AksharaMukhaTransliterator(TransliteratorBase):
     LANG2SCRIPT = {lang: script.title() for lang, script in ISO639_TO_SCRIPT.items()}
     LANG2SCRIPT['en'] = 'ISO'
@@ -95,6 +145,8 @@ class AksharaMukhaTransliterator(TransliteratorBase):
     # TODO: Add all supported languages supported: aksharamukha.appspot.com/documentation
     
     def __init__(self, src_lang, dest_lang):
+        from aksharamukha.transliterate import process as aksharamukha_xlit
+        self.aksharamukha_xlit = aksharamukha_xlit
         self.src_lang = src_lang
         self.dest_lang = dest_lang
         
@@ -109,7 +161,11 @@ class AksharaMukhaTransliterator(TransliteratorBase):
     
     def transliterate(self, phrase):
         phrase = self.pre_process(phrase)
-        return aksharamukha_xlit(self.src_script, self.dest_script, phrase, post_options=self.postprocess_options)
+        return self.aksharamukha_xlit(self.src_script, self.dest_script, phrase, post_options=self.postprocess_options)
     
     def reverse_transliterate(self, phrase):
-        return aksharamukha_xlit(self.dest_script, self.src_script, phrase, post_options=self.postprocess_options)
+        return self.aksharamukha_xlit(self.dest_script, self.src_script, phrase, post_options=self.postprocess_options)
+    
+    def transliterate_batch(self, phrases):
+        # Each process() call has a large fixed cost
+        return self.transliterate_joined(phrases)
@@ -0,0 +1,63 @@
+'''
+Geometric warps by smooth displacement fields. A field is computed on a coarse grid (a node every `step` pixels),
+and only upsampled to the full-resolution maps of cv2.remap() one band of rows at a time, over the region of
+the output actually needed. So beyond the input & output images, the memory needed stays bounded.
+'''
+import numpy as np
+import cv2
+
+# Maximum number of output pixels remapped at once: their maps take 8 bytes per pixel
+MAX_BAND_PIXELS = 1 << 22
+
+def get_coarse_grid(shape, step):
+    '''
+    The y & x coordinates (in full-resolution pixels) of the nodes of a grid covering the given shape,
+    placed like the pixel centers of an image which cv2.resize() would scale up by `step`
+    '''
+    rows, cols = -(-shape[0] // step), -(-shape[1] // step)
+    node_ys = (np.arange(rows, dtype=np.float32) + 0.5) * step - 0.5
+    node_xs = (np.arange(cols, dtype=np.float32) + 0.5) * step - 0.5
+    return node_ys, node_xs
+
+def upsample_field(field, step, y0, y1, x0, x1):
+    '''
+    The region [y0:y1, x0:x1] of the coarse field linearly interpolated to full resolution,
+    the same as cropped from the whole field scaled up by cv2.resize(), but resizing only the nodes around it
+    '''
+    if step == 1:
+        return field[y0:y1, x0:x1]
+    # With a node more on every side, the interpolation is the same as within the whole field
+    top, left = max(y0 // step - 1, 0), max(x0 // step - 1, 0)
+    bottom, right = min(-(-y1 // step) + 1, field.shape[0]), min(-(-x1 // step) + 1, field.shape[1])
+    block = cv2.resize(field[top:bottom, left:right], ((right - left) * step, (bottom - top) * step),
+                       interpolation=cv2.INTER_LINEAR)
+    return block[y0 - top*step:y1 - top*step, x0 - left*step:x1 - left*step]
+
+def get_displacement_maps(field, step, offset=(0, 0)):
+    '''
+    Maps for remap() from a coarse field of (dx, dy) displacements: the output pixel (x, y)
+    is sampled from (x + dx, y + dy) of the image, after moving the image by the given (x, y) offset
+    '''
+    def get_maps(y0, y1, x0, x1):
+        deltas = upsample_field(field, step, y0, y1, x0, x1)
+        xs = deltas[..., 0] + (np.arange(x0, x1, dtype=np.float32) - offset[0])
+        ys = deltas[..., 1] + (np.arange(y0, y1, dtype=np.float32)[:, None] - offset[1])
+        return xs, ys
+    return get_maps
+
+def remap(image, get_maps, region=None, interpolation=cv2.INTER_LINEAR, border_mode=cv2.BORDER_REFLECT,
+          max_band_pixels=MAX_BAND_PIXELS):
+    '''
+    Warp the image into the given (y0, y1, x0, x1) region of the output (by default, the image's own extent),
+    with the maps for each band of rows given by get_maps(y0, y1, x0, x1)
+    '''
+    y0, y1, x0, x1 = region or (0, image.shape[0], 0, image.shape[1])
+    output = np.empty((y1 - y0, x1 - x0) + image.shape[2:], dtype=image.dtype)
+    band_rows = max(1, max_band_pixels // max(1, x1 - x0))
+    for top in range(y0, y1, band_rows):
+        bottom = min(top + band_rows, y1)
+        xs, ys = get_maps(top, bottom, x0, x1)
+        band = output[top - y0:bottom - y0]
+        # Single-channel images come out of cv2 without their channel axis
+        band[...] = cv2.remap(image, xs, ys, interpolation, borderMode=border_mode).reshape(band.shape)
+    return output
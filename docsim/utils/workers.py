@@ -0,0 +1,18 @@
+import os
+
+def get_num_workers():
+    '''
+    Number of cores this process is allowed to run on
+    '''
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def get_chunk_size(num_items, num_workers, max_chunk_size=16, results_per_item=1):
+    '''
+    Default number of items sent to a worker at once: small enough to balance the load, big enough to amortize
+    the dispatch. When each item sends back several results (like all the epochs of an image), it's divided
+    by their number, so that the results of a chunk stay about as many as max_chunk_size
+    '''
+    chunk_size = max(1, min(max_chunk_size, num_items // (num_workers * 4)))
+    return max(1, chunk_size // results_per_item)
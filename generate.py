@@ -1,10 +1,25 @@
-import sys
+import os
+import argparse
 from docsim.generator import Generator
+from docsim.utils.sinks import add_output_arguments, get_sink_from_args
 
 if __name__ == '__main__':
-    # TODO: Use argparse
-    template_json = sys.argv[1]
-    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 1
-    output_folder = sys.argv[3] if len(sys.argv) > 3 else None
+    parser = argparse.ArgumentParser(description='Generate synthetic documents from a template')
+    parser.add_argument('template_json', help='Path to the template JSON')
+    parser.add_argument('num_samples', type=int, nargs='?', default=1, help='Number of samples to generate')
+    parser.add_argument('output_folder', nargs='?', default=None, help='Folder to write the samples to')
+    parser.add_argument('--num_workers', type=int, default=1, help='Number of processes to generate with')
+    parser.add_argument('--pipeline_threads', type=int, default=0,
+                        help='Number of background threads to encode and write samples with (when using a single process)')
+    add_output_arguments(parser)
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of a deterministic run: samples are named by index and a restarted run resumes')
+    parser.add_argument('--start_index', type=int, default=0,
+                        help='Index of the first sample, to split a seeded run into ranges (one output folder per range)')
+    args = parser.parse_args()
     
-    Generator(template_json).generate(samples, output_folder)
+    generator = Generator(args.template_json)
+    output_folder = args.output_folder or os.path.join('output', generator.doc_name)
+    sink = get_sink_from_args(output_folder, args)
+    generator.generate(args.num_samples, num_workers=args.num_workers, sink=sink, pipeline_threads=args.pipeline_threads,
+                       seed=args.seed, start_index=args.start_index)
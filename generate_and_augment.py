@@ -0,0 +1,20 @@
+import os
+import argparse
+from docsim.pipeline import Pipeline
+from docsim.utils.sinks import add_output_arguments, get_sink_from_args
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic documents from a template and augment them in memory')
+    parser.add_argument('template_json', help='Path to the template JSON')
+    parser.add_argument('config_json', help='Path to the augmentation config JSON')
+    parser.add_argument('num_samples', type=int, nargs='?', default=1, help='Number of samples to generate')
+    parser.add_argument('num_variants', type=int, nargs='?', default=1, help='Number of augmented variants per sample')
+    parser.add_argument('output_folder', nargs='?', default=None, help='Folder to write the augmented samples to')
+    parser.add_argument('--num_workers', type=int, default=1, help='Number of processes to generate & augment with')
+    add_output_arguments(parser)
+    args = parser.parse_args()
+    
+    pipeline = Pipeline(args.template_json, args.config_json)
+    output_folder = args.output_folder or os.path.join('output', pipeline.generator.doc_name, 'augmented')
+    sink = get_sink_from_args(output_folder, args)
+    pipeline(args.num_samples, args.num_variants, num_workers=args.num_workers, sink=sink)